@@ -0,0 +1,334 @@
+import importlib.util
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import timeit
+from contextlib import chdir
+from dataclasses import dataclass
+from datetime import datetime
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from types import ModuleType
+from typing import Annotated, Any, Callable, Optional, cast
+
+import typer
+from corpus import synthetic_posts, write_corpus
+
+from wwg.client import CrawlClient
+from wwg.config import ParserBackend, SplitUse
+from wwg.crawl import crawl_page
+from wwg.filters import TokenFilter
+from wwg.generate import find_subwords, generate_wordcloud, split_word
+from wwg.parser import get_parser, parse_time
+from wwg.segment import get_segmenter
+
+root = Path(__file__).resolve().parent
+fixtures = root / "fixtures"
+# relative create times of the fixtures are resolved against this
+fetched_at = datetime(2024, 1, 1, 12, 0, 0)
+
+app = typer.Typer(add_completion=False)
+
+
+class Skip(Exception):
+    """A benchmark that cannot run here, e.g. an optional backend is missing."""
+
+
+@dataclass
+class Context:
+    workdir: Path
+    corpus: Path
+    posts: list[dict[str, Any]]
+    font: Path | None
+
+
+# name -> setup, the setup returns the callable that is timed
+benchmarks: dict[str, Callable[[Context], Callable[[], object]]] = {}
+
+
+def benchmark(
+    name: str,
+) -> Callable[
+    [Callable[[Context], Callable[[], object]]],
+    Callable[[Context], Callable[[], object]],
+]:
+    def wrapper(
+        setup: Callable[[Context], Callable[[], object]],
+    ) -> Callable[[Context], Callable[[], object]]:
+        benchmarks[name] = setup
+        return setup
+
+    return wrapper
+
+
+class FixtureClient:
+    """Serves the saved pages in place of weibo.cn."""
+
+    def __init__(self) -> None:
+        self.profile = (fixtures / "profile.html").read_text(encoding="utf-8")
+        self.full_text = (fixtures / "full_text.html").read_text(encoding="utf-8")
+
+    def get(self, url: str) -> Any:
+        text = self.full_text if "/comment/" in url else self.profile
+        return type("Response", (), {"text": text})()
+
+
+@benchmark("parse_time")
+def bench_parse_time(context: Context) -> Callable[[], object]:
+    times = ["今天 12:34", "05月01日 08:00", "2023-12-31 23:59:59", "2023-12-31 23:59"]
+    return lambda: [parse_time(s, fetched_at) for s in times]
+
+
+def bench_parse_page(backend: ParserBackend) -> None:
+    @benchmark(f"parse_page[{backend}]")
+    def setup(context: Context) -> Callable[[], object]:
+        parser = get_parser(backend)
+        html = (fixtures / "profile.html").read_text(encoding="utf-8")
+        return lambda: parser.parse_page(html, fetched_at)
+
+    @benchmark(f"parse_full_text[{backend}]")
+    def setup_full_text(context: Context) -> Callable[[], object]:
+        parser = get_parser(backend)
+        html = (fixtures / "full_text.html").read_text(encoding="utf-8")
+        return lambda: parser.parse_full_text("Pg7h8i9", html, fetched_at)
+
+    @benchmark(f"crawl_page[{backend}]")
+    def setup_crawl(context: Context) -> Callable[[], object]:
+        parser = get_parser(backend)
+        client = cast(CrawlClient, FixtureClient())
+        # full text pages are fetched inline, no thread pool
+        return lambda: list(
+            crawl_page("https://weibo.cn/1/profile", client, parser, True)
+        )
+
+
+def bench_split_word(split_use: SplitUse) -> None:
+    @benchmark(f"split_word[{split_use}]")
+    def setup(context: Context) -> Callable[[], object]:
+        segmenter = get_segmenter(split_use)
+        try:
+            # the model is loaded once per run, not timed
+            segmenter.backend
+        except ImportError as e:
+            raise Skip(f"{split_use} is not installed: {e}")
+        token_filter = TokenFilter()
+        return lambda: split_word(context.posts, segmenter, token_filter)
+
+
+for backend in ParserBackend:
+    bench_parse_page(backend)
+for split_use in SplitUse:
+    bench_split_word(split_use)
+
+
+def corpus_tokens(context: Context) -> list[list[str]]:
+    return get_segmenter(SplitUse.JIEBA).cut_many(
+        [post["content"] for post in context.posts]
+    )
+
+
+@benchmark("find_subwords")
+def bench_find_subwords(context: Context) -> Callable[[], object]:
+    token_filter = TokenFilter()
+    words = {word for tokens in corpus_tokens(context) for word in token_filter(tokens)}
+    return lambda: find_subwords(words)
+
+
+@benchmark("token_filter")
+def bench_token_filter(context: Context) -> Callable[[], object]:
+    token_filter = TokenFilter()
+    word_lists = corpus_tokens(context)
+    return lambda: [token_filter(word_list) for word_list in word_lists]
+
+
+@benchmark("generate_wordcloud")
+def bench_generate_wordcloud(context: Context) -> Callable[[], object]:
+    frequencies = split_word(
+        context.posts, get_segmenter(SplitUse.JIEBA), TokenFilter()
+    )
+    output = context.workdir / "weibo.png"
+    return lambda: generate_wordcloud(frequencies, output, 400, context.font)
+
+
+@benchmark("query_weibo_by_time")
+def bench_query_weibo_by_time(context: Context) -> Callable[[], object]:
+    try:
+        mcp_server = load_mcp_server()
+    except ImportError as e:
+        raise Skip(f"mcp server dependencies are not installed: {e}")
+    # fastmcp wraps the function in a tool object
+    query = getattr(mcp_server.query_weibo_by_time, "fn", None)
+    if query is None:
+        query = mcp_server.query_weibo_by_time
+    (context.workdir / "weibo.jsonl").write_bytes(context.corpus.read_bytes())
+    times = sorted(post["create_at"] for post in context.posts)
+    # the middle half of the corpus
+    start, end = times[len(times) // 4], times[len(times) * 3 // 4]
+
+    def run() -> object:
+        # the server reads weibo.jsonl from the working directory
+        with chdir(context.workdir):
+            return query(start, end)
+
+    return run
+
+
+def load_mcp_server() -> ModuleType:
+    spec = importlib.util.spec_from_file_location(
+        "mcp_server", root.parent / "mcp_server.py"
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(run: Callable[[], object], repeat: int) -> dict[str, Any]:
+    timer = timeit.Timer(run)
+    # enough calls per sample for about 0.2 seconds, at least one
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "status": "ok",
+        "number": number,
+        "repeat": repeat,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def package_version() -> str | None:
+    try:
+        return version("wwg")
+    except PackageNotFoundError:
+        return None
+
+
+@app.command()
+def run(
+    output: Annotated[
+        Path, typer.Option(dir_okay=False, help="json file of the results")
+    ] = Path("bench.json"),
+    only: Annotated[
+        Optional[list[str]],
+        typer.Option(help="run the benchmarks whose name starts with this"),
+    ] = None,
+    size: Annotated[int, typer.Option(min=1, help="posts in the corpus")] = 2000,
+    days: Annotated[int, typer.Option(min=1)] = 365,
+    min_length: Annotated[int, typer.Option(min=1)] = 10,
+    max_length: Annotated[int, typer.Option(min=1)] = 140,
+    seed: Annotated[int, typer.Option()] = 0,
+    repeat: Annotated[int, typer.Option(min=1, help="samples per benchmark")] = 5,
+    font: Annotated[
+        Optional[Path],
+        typer.Option(help="font of generate_wordcloud", exists=True, dir_okay=False),
+    ] = None,
+) -> None:
+    """Run the benchmarks on a synthetic corpus and write the timings."""
+    selected = [
+        name
+        for name in benchmarks
+        if not only or any(name.startswith(prefix) for prefix in only)
+    ]
+    results: dict[str, dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        corpus = workdir / "corpus.jsonl"
+        write_corpus(
+            corpus,
+            synthetic_posts(
+                size,
+                datetime(2024, 12, 31, 23, 59, 59),
+                days,
+                min_length,
+                max_length,
+                seed,
+            ),
+        )
+        posts = [json.loads(line) for line in corpus.read_text("utf-8").splitlines()]
+        context = Context(workdir, corpus, posts, font)
+        for name in selected:
+            try:
+                results[name] = measure(benchmarks[name](context), repeat)
+                print(f"{name}: {results[name]['median'] * 1000:.3f} ms")
+            except Skip as e:
+                results[name] = {"status": "skipped", "reason": str(e)}
+                print(f"{name}: skipped, {e}")
+
+    output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "version": package_version(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "corpus": {
+                    "size": size,
+                    "days": days,
+                    "min_length": min_length,
+                    "max_length": max_length,
+                    "seed": seed,
+                },
+                "results": results,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    print(f"results written to {output}")
+
+
+@app.command()
+def compare(
+    baseline: Annotated[Path, typer.Argument(exists=True, dir_okay=False)],
+    current: Annotated[Path, typer.Argument(exists=True, dir_okay=False)],
+    threshold: Annotated[
+        float, typer.Option(help="ratio of the medians reported as a regression")
+    ] = 1.1,
+) -> None:
+    """Compare the medians of two result files, fail on a regression."""
+    before = json.loads(baseline.read_text(encoding="utf-8"))
+    after = json.loads(current.read_text(encoding="utf-8"))
+    if before["corpus"] != after["corpus"]:
+        print("warning: the results were measured on different corpora")
+    regressions = 0
+    for name, result in after["results"].items():
+        old = before["results"].get(name)
+        if result["status"] != "ok" or old is None or old["status"] != "ok":
+            print(f"{name:32} {'-':>12} {'-':>12}")
+            continue
+        ratio = result["median"] / old["median"]
+        mark = ""
+        if ratio > threshold:
+            regressions += 1
+            mark = " slower"
+        print(
+            f"{name:32} {old['median'] * 1000:>10.3f}ms "
+            f"{result['median'] * 1000:>10.3f}ms {ratio:>6.2f}x{mark}"
+        )
+    if regressions > 0:
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,85 @@
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Annotated, Any, Iterator
+
+import typer
+
+from wwg.corpus import time_format
+
+# common words, stopwords and the noise found in real posts, so that
+# segmentation, filtering and subword removal all have work to do
+vocabulary = (
+    "我们 今天 天气 很好 北京 上海 学习 工作 生活 快乐 朋友 电影 音乐 咖啡 早餐 "
+    "晚上 周末 旅行 城市 公园 跑步 读书 自然语言 自然 语言 处理 分词 中文 数据 分析 "
+    "模型 程序 代码 周报 加班 展览 排队 新年 春节 回家 下雨 地铁 猫 狗 的 了 是 在 "
+    "也 就 都 还 又 很 和 吧 啊 呢 网页链接 网页 链接 jpg"
+).split()
+punctuation = "，，，。。！？、……～"
+extras = ["@朋友", "@某人", "#读书#", "#周末#", "[赞]", "[笑cry]", "2024", "OK"]
+
+
+def synthetic_posts(
+    size: int,
+    newest: datetime,
+    days: int,
+    min_length: int,
+    max_length: int,
+    seed: int = 0,
+) -> Iterator[dict[str, Any]]:
+    """Posts in timeline order, newest first, the same for the same arguments."""
+    rng = random.Random(seed)
+    # seconds before the newest post, ascending
+    offsets = sorted(rng.randrange(days * 24 * 3600) for _ in range(size))
+    for i, offset in enumerate(offsets):
+        length = rng.randint(min_length, max_length)
+        parts: list[str] = []
+        while sum(len(part) for part in parts) < length:
+            roll = rng.random()
+            if roll < 0.12:
+                parts.append(rng.choice(punctuation))
+            elif roll < 0.16:
+                parts.append(rng.choice(extras))
+            else:
+                parts.append(rng.choice(vocabulary))
+        yield {
+            "id": str(5_000_000_000 + size - i),
+            "content": "".join(parts)[:length],
+            "create_at": (newest - timedelta(seconds=offset)).strftime(time_format),
+        }
+
+
+def write_corpus(path: Path, posts: Iterator[dict[str, Any]]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for post in posts:
+            f.write(json.dumps(post, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main(
+    output: Annotated[Path, typer.Option(dir_okay=False)] = Path("weibo.jsonl"),
+    size: Annotated[int, typer.Option(min=1, help="number of posts")] = 10000,
+    newest: Annotated[
+        datetime, typer.Option(help="create time of the newest post")
+    ] = datetime(2024, 12, 31, 23, 59, 59),
+    days: Annotated[
+        int, typer.Option(min=1, help="days between the oldest and newest post")
+    ] = 365,
+    min_length: Annotated[int, typer.Option(min=1)] = 10,
+    max_length: Annotated[int, typer.Option(min=1)] = 140,
+    seed: Annotated[int, typer.Option()] = 0,
+) -> None:
+    """Write a synthetic weibo.jsonl in the format of wwg crawl."""
+    if min_length > max_length:
+        raise typer.BadParameter("min-length is greater than max-length")
+    count = write_corpus(
+        output, synthetic_posts(size, newest, days, min_length, max_length, seed)
+    )
+    print(f"{count} posts written to {output}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
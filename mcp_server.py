@@ -6,6 +6,8 @@ from pathlib import Path
 import yaml
 from fastmcp import FastMCP
 
+from wwg.corpus import read_posts
+
 # Global blog index - will be populated at module level
 BLOG_INDEX = []
 
@@ -162,29 +164,24 @@ def query_weibo_by_time(start: str, end: str) -> list[dict]:
     result = []
 
     # Add weibo content
-    file_path = Path("weibo.jsonl")
+    # 语料库不比 weibo.jsonl 旧时优先使用，按 create_at 索引读取；
+    # 未配置 store 的爬取只更新 weibo.jsonl，此时语料库已过时
+    store, jsonl = Path("weibo.sqlite"), Path("weibo.jsonl")
+    file_path = jsonl
+    if store.exists() and (
+        not jsonl.exists() or store.stat().st_mtime >= jsonl.stat().st_mtime
+    ):
+        file_path = store
     if file_path.exists():
-        for line in file_path.read_text(encoding="utf-8").splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                content = json.loads(line)
-                # 假设 create_at 格式为 "2025-01-10T12:34:56"
-                create_at_dt = datetime.strptime(
-                    content["create_at"], "%Y-%m-%dT%H:%M:%S"
-                )
-            except (json.JSONDecodeError, KeyError, ValueError):
-                continue  # 跳过无效行
-
-            if start_time <= create_at_dt <= end_time:
-                result.append(
-                    {
-                        "create_at": content["create_at"],
-                        "content": content["content"],
-                        "type": "weibo",
-                    }
-                )
+        # 按 create_at 原文跳过范围外的行，只解析范围内的微博
+        for content in read_posts(file_path, start_time, end_time):
+            result.append(
+                {
+                    "create_at": content["create_at"],
+                    "content": content["content"],
+                    "type": "weibo",
+                }
+            )
 
     # Add blog content from the same time range
     for blog_entry in BLOG_INDEX:
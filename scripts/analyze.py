@@ -1,4 +1,3 @@
-import json
 from datetime import datetime
 from pathlib import Path
 
@@ -6,14 +5,14 @@ import numpy as np
 from matplotlib import colormaps
 from matplotlib import pyplot as plt
 
+from wwg.corpus import read_posts
+
 
 def load_weibo(filename: str) -> list[tuple[str, datetime]]:
-    lines: list[str] = Path(filename).read_text(encoding="utf-8").splitlines()
-    result = []
-    for line in lines:
-        data = json.loads(line)
-        result.append((data["content"], datetime.fromisoformat(data["create_at"])))
-    return result
+    return [
+        (data["content"], datetime.fromisoformat(data["create_at"]))
+        for data in read_posts(Path(filename))
+    ]
 
 
 def plot_polar_by_month(year: int) -> None:
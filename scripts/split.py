@@ -3,6 +3,8 @@ from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 
+from wwg.corpus import read_posts
+
 
 def split_by_month(input_file: str, output_dir: str) -> None:
     # 创建输出目录
@@ -11,14 +13,12 @@ def split_by_month(input_file: str, output_dir: str) -> None:
     # 用于存储按月分组的数据
     monthly_data = defaultdict(list)
 
-    # 读取输入文件
-    with open(input_file, "r", encoding="utf-8") as f:
-        for line in f:
-            data = json.loads(line)
-            # 解析日期并提取年月
-            date = datetime.fromisoformat(data["create_at"])
-            month_key = f"{date.year}-{date.month:02d}"
-            monthly_data[month_key].append(data)
+    # 逐行读取输入文件
+    for data in read_posts(Path(input_file)):
+        # 解析日期并提取年月
+        date = datetime.fromisoformat(data["create_at"])
+        month_key = f"{date.year}-{date.month:02d}"
+        monthly_data[month_key].append(data)
 
     # 写入分组后的文件
     for month, entries in monthly_data.items():
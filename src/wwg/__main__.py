@@ -1,13 +1,26 @@
+import cProfile
 import logging
+import pstats
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Annotated, Optional
 
 import typer
 
+import wwg.corpus
 import wwg.crawl
 import wwg.generate
-from wwg.config import Config, init_config, init_logger, update_config, SplitUse
+from wwg.client import CookieExpiredError, FetchFailedError
+from wwg.config import (
+    Config,
+    GroupBy,
+    ParserBackend,
+    SplitUse,
+    init_config,
+    init_logger,
+    update_config,
+)
 
 logger = logging.getLogger("wwg")
 
@@ -18,15 +31,32 @@ CONFIG: Config = Config()
 
 @app.callback()
 def main(
+    ctx: typer.Context,
     verbose: bool = False,
     config_file: Annotated[
         Optional[Path],
         typer.Option(exists=True, dir_okay=False, readable=True, resolve_path=True),
     ] = None,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            help="profile the command with cProfile, worker processes excluded"
+        ),
+    ] = False,
+    profile_output: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="write the profile to this file (format: pstats), implies --profile",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
 ) -> None:
     global CONFIG
 
     init_logger(verbose)
+    if profile or profile_output is not None:
+        start_profile(ctx, profile_output)
     if config_file is not None:
         logger.debug(f"load configuration from {config_file}")
         CONFIG = init_config(config_file)
@@ -37,6 +67,22 @@ def main(
         logger.debug("using default configuration")
 
 
+def start_profile(ctx: typer.Context, output: Path | None) -> None:
+    profiler = cProfile.Profile()
+
+    def stop() -> None:
+        profiler.disable()
+        if output is not None:
+            profiler.dump_stats(output)
+            logger.info(f"profile written to {output}")
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(30)
+
+    # the subcommand runs after this callback returns, stop once it is done
+    ctx.call_on_close(stop)
+    profiler.enable()
+
+
 @app.command(
     help="Crawl Weibo content. "
     "If options are not specified explicitly, "
@@ -67,6 +113,115 @@ def crawl(
             help="crawling result storage path (format: JSONL)", resolve_path=True
         ),
     ] = None,
+    incremental: Annotated[
+        Optional[bool],
+        typer.Option(
+            help="append only posts not stored in output yet, "
+            "resuming from the last checkpoint if there is one"
+        ),
+    ] = None,
+    interval: Annotated[
+        Optional[float],
+        typer.Option(help="average seconds between two requests"),
+    ] = None,
+    burst: Annotated[
+        Optional[int],
+        typer.Option(help="number of requests allowed back to back"),
+    ] = None,
+    adaptive: Annotated[
+        Optional[bool],
+        typer.Option(
+            help="adapt the interval to server responses, "
+            "between min-interval and max-interval"
+        ),
+    ] = None,
+    min_interval: Annotated[
+        Optional[float],
+        typer.Option(help="lower bound of the adaptive interval in seconds"),
+    ] = None,
+    max_interval: Annotated[
+        Optional[float],
+        typer.Option(help="upper bound of the adaptive interval in seconds"),
+    ] = None,
+    workers: Annotated[
+        Optional[int],
+        typer.Option(help="number of threads fetching full text pages"),
+    ] = None,
+    timeout: Annotated[
+        Optional[float], typer.Option(help="timeout of a single request in seconds")
+    ] = None,
+    max_retries: Annotated[
+        Optional[int], typer.Option(help="maximum retries of a failed request")
+    ] = None,
+    parser: Annotated[
+        Optional[ParserBackend],
+        typer.Option(help="HTML parser backend, choose from 'lxml', 'html5lib'"),
+    ] = None,
+    archive: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="store every fetched page compressed in this archive (format: SQLite)",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    replay: Annotated[
+        bool,
+        typer.Option(
+            "--replay",
+            help="rebuild output from the archive without network access",
+        ),
+    ] = False,
+    batch: Annotated[
+        bool,
+        typer.Option(
+            "--batch",
+            help="crawl every account listed in crawl.accounts concurrently",
+        ),
+    ] = False,
+    batch_workers: Annotated[
+        Optional[int],
+        typer.Option(help="number of accounts crawled at the same time"),
+    ] = None,
+    partitions: Annotated[
+        Optional[int],
+        typer.Option(
+            help="split [start_page, max_page] into this many ranges "
+            "crawled in parallel, then merge them into output"
+        ),
+    ] = None,
+    metrics: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="write request, page and parse metrics to this file (format: JSONL)",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    prometheus: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="write crawl metrics to this Prometheus textfile",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    progress_interval: Annotated[
+        Optional[float],
+        typer.Option(help="seconds between two progress lines"),
+    ] = None,
+    fsync_interval: Annotated[
+        Optional[float],
+        typer.Option(help="seconds between two fsyncs of the output"),
+    ] = None,
+    store: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="sqlite corpus store crawled posts are also written to",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
 ) -> None:
     config = CONFIG.crawl
     update_config(config, "uid", uid)
@@ -76,25 +231,148 @@ def crawl(
     update_config(config, "max_page", max_page)
     update_config(config, "after", after)
     update_config(config, "output", output)
-    if config.uid is None or config.uid == "":
+    update_config(config, "incremental", incremental)
+    update_config(config, "interval", interval)
+    update_config(config, "burst", burst)
+    update_config(config, "adaptive", adaptive)
+    update_config(config, "min_interval", min_interval)
+    update_config(config, "max_interval", max_interval)
+    update_config(config, "workers", workers)
+    update_config(config, "timeout", timeout)
+    update_config(config, "max_retries", max_retries)
+    update_config(config, "parser", parser)
+    update_config(config, "archive", archive)
+    update_config(config, "batch_workers", batch_workers)
+    update_config(config, "partitions", partitions)
+    update_config(config, "metrics", metrics)
+    update_config(config, "prometheus", prometheus)
+    update_config(config, "progress_interval", progress_interval)
+    update_config(config, "fsync_interval", fsync_interval)
+    update_config(config, "store", store)
+    if batch:
+        if len(config.accounts) == 0:
+            raise typer.BadParameter(
+                "accounts are missing, please list them in crawl.accounts"
+            )
+        for account in config.accounts:
+            if (account.cookies is None or account.cookies == "") and (
+                config.cookies is None or config.cookies == ""
+            ):
+                raise typer.BadParameter(f"cookie of account {account.uid} is missing")
+    elif config.uid is None or config.uid == "":
         raise typer.BadParameter(
             "uid is missing, "
             "please provide it via command line argument or configuration file",
         )
-    if config.cookies is None or config.cookies == "":
+    if replay and (config.archive is None or not config.archive.exists()):
+        raise typer.BadParameter(
+            "archive is missing, "
+            "please provide an existing one via command line argument "
+            "or configuration file"
+        )
+    if not replay and not batch and (config.cookies is None or config.cookies == ""):
         raise typer.BadParameter(
             "cookie is missing, "
             "please provide it via command line argument or configuration file"
         )
     if config.start_page < 1:
         raise typer.BadParameter("start page must greater than 1")
+    if config.partitions > 1 and config.max_page < config.start_page:
+        raise typer.BadParameter("max page is required to split pages into ranges")
     logger.debug(f"uid: {config.uid}")
     logger.debug(f"original_only: {config.original_only}")
     logger.debug(f"start_page: {config.start_page}")
     logger.debug(f"max_page: {config.max_page}")
     logger.debug(f"after: {config.after}")
     logger.debug(f"output: {config.output}")
-    wwg.crawl.main(config)
+    logger.debug(f"incremental: {config.incremental}")
+    logger.debug(f"interval: {config.interval}")
+    logger.debug(f"burst: {config.burst}")
+    logger.debug(f"adaptive: {config.adaptive}")
+    logger.debug(f"min_interval: {config.min_interval}")
+    logger.debug(f"max_interval: {config.max_interval}")
+    logger.debug(f"workers: {config.workers}")
+    logger.debug(f"timeout: {config.timeout}")
+    logger.debug(f"max_retries: {config.max_retries}")
+    logger.debug(f"parser: {config.parser}")
+    logger.debug(f"archive: {config.archive}")
+    logger.debug(f"batch_workers: {config.batch_workers}")
+    logger.debug(f"partitions: {config.partitions}")
+    logger.debug(f"metrics: {config.metrics}")
+    logger.debug(f"prometheus: {config.prometheus}")
+    logger.debug(f"progress_interval: {config.progress_interval}")
+    logger.debug(f"fsync_interval: {config.fsync_interval}")
+    logger.debug(f"store: {config.store}")
+    if replay:
+        for c in (
+            [wwg.crawl.account_config(config, a) for a in config.accounts]
+            if batch
+            else [config]
+        ):
+            wwg.crawl.replay(c)
+        return
+    try:
+        if batch:
+            wwg.crawl.batch(config)
+        elif config.partitions > 1:
+            wwg.crawl.backfill(config)
+        else:
+            wwg.crawl.main(config)
+    except CookieExpiredError as e:
+        logger.error(f"{e}, please update crawl.cookies")
+        raise typer.Exit(code=1)
+    except FetchFailedError as e:
+        logger.error(f"{e}, run the same command again to resume")
+        raise typer.Exit(code=1)
+
+
+@app.command(
+    help="Build or update the sqlite corpus store from crawled posts. "
+    "If options are not specified explicitly, "
+    "values in the configuration file are used."
+)
+def index(
+    input: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="JSONL file to index, crawl.output by default",
+            exists=True,
+            dir_okay=False,
+            readable=True,
+            resolve_path=True,
+        ),
+    ] = None,
+    store: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="sqlite corpus store path", dir_okay=False, resolve_path=True
+        ),
+    ] = None,
+    uid: Annotated[
+        Optional[str], typer.Option(help="Weibo user id the posts belong to")
+    ] = None,
+) -> None:
+    config = CONFIG.crawl
+    update_config(config, "store", store)
+    if input is None:
+        input = config.output
+    if uid is None:
+        uid = config.uid
+
+    if config.store is None:
+        raise typer.BadParameter(
+            "store is None, "
+            "please specify via command line parameters "
+            "or configuration file entries"
+        )
+    if not input.is_file():
+        raise typer.BadParameter(f"cannot read input file {input}")
+
+    logger.debug(f"input: {input}")
+    logger.debug(f"store: {config.store}")
+    logger.debug(f"uid: {uid}")
+
+    wwg.corpus.index(input, config.store, uid)
 
 
 @app.command(
@@ -175,6 +453,76 @@ def generate(
             help="word segmentation tool, choose from 'jieba', 'thulac', 'pkuseg'",
         )
     ] = None,
+    workers: Annotated[
+        Optional[int],
+        typer.Option(
+            help="processes segmenting posts in parallel",
+            callback=lambda x: max(1, x) if x is not None else None,
+        ),
+    ] = None,
+    batch_size: Annotated[
+        Optional[int],
+        typer.Option(
+            help="posts per model call of batched segmenters like hanlp",
+            callback=lambda x: max(1, x) if x is not None else None,
+        ),
+    ] = None,
+    batch_max_chars: Annotated[
+        Optional[int],
+        typer.Option(help="max characters per batch, 0 for no limit"),
+    ] = None,
+    chunk_size: Annotated[
+        Optional[int],
+        typer.Option(
+            help="posts read and segmented at a time, bounds memory",
+            callback=lambda x: max(1, x) if x is not None else None,
+        ),
+    ] = None,
+    cache: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="sqlite token cache, posts in it are not segmented again",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    colormap: Annotated[
+        Optional[str], typer.Option(help="matplotlib colormap of the wordcloud")
+    ] = None,
+    scale: Annotated[
+        Optional[float],
+        typer.Option(help="scale between the layout and the written image"),
+    ] = None,
+    group_by: Annotated[
+        Optional[GroupBy],
+        typer.Option(help="generate one wordcloud per period, named after it"),
+    ] = None,
+    aggregate: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="sqlite store of word counts per day, updated with new posts",
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    stopwords: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="file of additional stopwords, one per line",
+            exists=True,
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
+    exclude: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="file of additional words to leave out, one per line",
+            exists=True,
+            dir_okay=False,
+            resolve_path=True,
+        ),
+    ] = None,
 ) -> None:
     config = CONFIG.generate
     update_config(config, "input", input)
@@ -186,6 +534,19 @@ def generate(
     update_config(config, "max_word", max_word)
     update_config(config, "output", output)
     update_config(config, "split_use", split_use)
+    update_config(config, "workers", workers)
+    update_config(config, "batch_size", batch_size)
+    update_config(config, "batch_max_chars", batch_max_chars)
+    update_config(config, "chunk_size", chunk_size)
+    # the config file is not checked by the option callback
+    config.chunk_size = max(1, config.chunk_size)
+    update_config(config, "cache", cache)
+    update_config(config, "colormap", colormap)
+    update_config(config, "scale", scale)
+    update_config(config, "group_by", group_by)
+    update_config(config, "aggregate", aggregate)
+    update_config(config, "stopwords", stopwords)
+    update_config(config, "exclude", exclude)
 
     if config.input is None:
         config.input = CONFIG.crawl.output
@@ -206,6 +567,18 @@ def generate(
     logger.debug(f"max_word: {config.max_word}")
     logger.debug(f"output: {config.output}")
     logger.debug(f"split_use: {config.split_use}")
+    logger.debug(f"workers: {config.workers}")
+    logger.debug(f"batch_size: {config.batch_size}")
+    logger.debug(f"batch_max_chars: {config.batch_max_chars}")
+    logger.debug(f"chunk_size: {config.chunk_size}")
+    logger.debug(f"cache: {config.cache}")
+    logger.debug(f"colormap: {config.colormap}")
+    logger.debug(f"scale: {config.scale}")
+    logger.debug(f"variants: {len(config.variants)}")
+    logger.debug(f"group_by: {config.group_by}")
+    logger.debug(f"aggregate: {config.aggregate}")
+    logger.debug(f"stopwords: {config.stopwords}")
+    logger.debug(f"exclude: {config.exclude}")
 
     wwg.generate.main(CONFIG.generate)
 
@@ -0,0 +1,177 @@
+import logging
+import sqlite3
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterable
+
+from wwg.cache import lookup_chunk
+from wwg.config import GroupBy
+from wwg.corpus import period_of
+
+logger = logging.getLogger(__name__)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class DayAggregates:
+    """Word counts per calendar day and per month in sqlite.
+
+    Counts are the segmented and stopword filtered tokens of every post,
+    the ids of counted posts are kept so that a post is never counted
+    twice. The input last counted is recorded by path, size and mtime, an
+    input that changed since is scanned again for uncounted posts. A date
+    range is summed from whole months plus the days at its edges. Ranges
+    are resolved to whole days.
+    """
+
+    def __init__(self, path: Path, fingerprint: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS posts (id TEXT PRIMARY KEY) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS days ("
+            "day TEXT, word TEXT, n INTEGER NOT NULL, "
+            "PRIMARY KEY (day, word)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS months ("
+            "month TEXT, word TEXT, n INTEGER NOT NULL, "
+            "PRIMARY KEY (month, word)) WITHOUT ROWID;"
+        )
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'segmenter'"
+        ).fetchone()
+        # counts of another segmenter, custom dict or filter are of no use
+        if row is not None and row[0] != fingerprint:
+            logger.info(f"segmenter or filter changed, rebuild aggregates {path}")
+            self._conn.executescript(
+                "DELETE FROM posts; DELETE FROM days; DELETE FROM months; "
+                "DELETE FROM meta WHERE key = 'source';"
+            )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('segmenter', ?)", (fingerprint,)
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "DayAggregates":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def source(self) -> str | None:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'source'"
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_source(self, source: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('source', ?)", (source,)
+            )
+
+    def unseen(self, posts: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Posts whose id has not been counted yet."""
+        posts = list({post["id"]: post for post in posts}.values())
+        seen: set[str] = set()
+        for i in range(0, len(posts), lookup_chunk):
+            chunk = [post["id"] for post in posts[i : i + lookup_chunk]]
+            seen.update(
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT id FROM posts WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return [post for post in posts if post["id"] not in seen]
+
+    def add(self, ids: list[str], days: dict[str, Counter[str]]) -> None:
+        """Add the word counts per day of the posts with ids, in one go."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO posts VALUES (?)", ((i,) for i in ids)
+            )
+            for table, key in (("days", lambda d: d), ("months", lambda d: d[:7])):
+                self._conn.executemany(
+                    f"INSERT INTO {table} VALUES (?, ?, ?) "
+                    f"ON CONFLICT ({table[:-1]}, word) DO UPDATE "
+                    "SET n = n + excluded.n",
+                    (
+                        (key(day), word, n)
+                        for day, counter in days.items()
+                        for word, n in counter.items()
+                    ),
+                )
+
+    def counters(
+        self, after: datetime, before: datetime, group_by: GroupBy | None = None
+    ) -> dict[str, Counter[str]]:
+        """Summed counts of the days in [after, before], by period if given."""
+        # weeks cross month borders, only days add up to them
+        segments = self._segments(
+            after.date(), before.date(), group_by not in (GroupBy.DAY, GroupBy.WEEK)
+        )
+        if group_by is None:
+            sql = " UNION ALL ".join(
+                f"SELECT word, n FROM {table} WHERE {table[:-1]} BETWEEN ? AND ?"
+                for table, _, _ in segments
+            )
+            counter: Counter[str] = Counter()
+            for word, n in self._conn.execute(
+                f"SELECT word, sum(n) FROM ({sql}) GROUP BY word",
+                [bound for _, low, high in segments for bound in (low, high)],
+            ):
+                counter[word] = n
+            return {"": counter}
+        result: dict[str, Counter[str]] = defaultdict(Counter)
+        for table, low, high in segments:
+            column = table[:-1]
+            for key, word, n in self._conn.execute(
+                f"SELECT {column}, word, n FROM {table} "
+                f"WHERE {column} BETWEEN ? AND ?",
+                (low, high),
+            ):
+                # a month is looked up through its first day
+                day = key if len(key) == 10 else f"{key}-01"
+                result[period_of(day, group_by)][word] += n
+        return result
+
+    def _segments(
+        self, first: date, last: date, monthly: bool
+    ) -> list[tuple[str, str, str]]:
+        """(table, low, high) ranges covering the days from first to last."""
+        if first > last:
+            return [("days", "", "")]
+        full_first = first if first.day == 1 else next_month(first)
+        # exclusive end of the whole months
+        full_end = (
+            next_month(last)
+            if next_month(last) - timedelta(days=1) == last
+            else last.replace(day=1)
+        )
+        if not monthly or full_first >= full_end:
+            return [("days", first.isoformat(), last.isoformat())]
+        segments = [
+            (
+                "months",
+                full_first.strftime("%Y-%m"),
+                (full_end - timedelta(days=1)).strftime("%Y-%m"),
+            )
+        ]
+        if first < full_first:
+            segments.append(
+                (
+                    "days",
+                    first.isoformat(),
+                    (full_first - timedelta(days=1)).isoformat(),
+                )
+            )
+        if full_end <= last:
+            segments.append(("days", full_end.isoformat(), last.isoformat()))
+        return segments
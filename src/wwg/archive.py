@@ -0,0 +1,90 @@
+import logging
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArchivedPage:
+    rowid: int
+    url: str
+    fetched_at: datetime
+
+
+class Archive:
+    """Raw responses of a crawl, zlib compressed in a sqlite database.
+
+    Pages are keyed by url and fetch time, fetching the same url twice keeps
+    both versions.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # the crawl stores pages from the full text worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT NOT NULL, "
+            "fetched_at TEXT NOT NULL, "
+            "body BLOB NOT NULL, "
+            "PRIMARY KEY (url, fetched_at))"
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def put(self, url: str, text: str, fetched_at: datetime | None = None) -> None:
+        if fetched_at is None:
+            fetched_at = datetime.now()
+        body = zlib.compress(text.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?)",
+                (url, fetched_at.isoformat(), body),
+            )
+            self._conn.commit()
+
+    def pages(self, prefix: str = "") -> list[ArchivedPage]:
+        """Archived pages whose url starts with prefix, oldest fetch first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, url, fetched_at FROM pages "
+                "WHERE substr(url, 1, ?) = ? ORDER BY fetched_at, rowid",
+                (len(prefix), prefix),
+            ).fetchall()
+        return [ArchivedPage(r[0], r[1], datetime.fromisoformat(r[2])) for r in rows]
+
+    def latest(self, url: str) -> ArchivedPage | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rowid, url, fetched_at FROM pages WHERE url = ? "
+                "ORDER BY fetched_at DESC LIMIT 1",
+                (url,),
+            ).fetchone()
+        return (
+            ArchivedPage(row[0], row[1], datetime.fromisoformat(row[2]))
+            if row
+            else None
+        )
+
+    def read(self, rowid: int) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM pages WHERE rowid = ?", (rowid,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(rowid)
+        return zlib.decompress(row[0]).decode("utf-8")
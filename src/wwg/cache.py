@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+
+from wwg.segment import Segmenter
+
+logger = logging.getLogger(__name__)
+
+# sqlite allows 999 parameters per statement in older builds
+lookup_chunk = 500
+
+
+class TokenCache:
+    """Segmented posts in a sqlite database, keyed by a hash of the content.
+
+    The key covers the segmenter name and the custom dict content as well,
+    so changing either never returns stale tokens. Raw tokens are stored,
+    stopwords are filtered after the lookup.
+    """
+
+    def __init__(self, path: Path, segmenter: Segmenter) -> None:
+        self.path = path
+        self.namespace = f"{segmenter.fingerprint()}\0"
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "key TEXT PRIMARY KEY, "
+            "tokens TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "TokenCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def key(self, content: str) -> str:
+        return hashlib.sha256(f"{self.namespace}{content}".encode("utf-8")).hexdigest()
+
+    def get_many(self, contents: Iterable[str]) -> dict[str, list[str]]:
+        """Tokens of the contents found in the cache, by content."""
+        keys = {self.key(content): content for content in contents}
+        key_list = list(keys)
+        result: dict[str, list[str]] = {}
+        for i in range(0, len(key_list), lookup_chunk):
+            chunk = key_list[i : i + lookup_chunk]
+            rows = self._conn.execute(
+                "SELECT key, tokens FROM tokens "
+                f"WHERE key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, tokens in rows:
+                result[keys[key]] = json.loads(tokens)
+        return result
+
+    def put_many(self, items: Iterable[tuple[str, list[str]]]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tokens VALUES (?, ?)",
+            (
+                (self.key(content), json.dumps(tokens, ensure_ascii=False))
+                for content, tokens in items
+            ),
+        )
+        self._conn.commit()
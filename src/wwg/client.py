@@ -0,0 +1,177 @@
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wwg.archive import Archive
+from wwg.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36 Edg/118.0.2088.33"  # noqa
+rate_limit_status = {403, 418, 429}
+
+
+class CookieExpiredError(Exception):
+    pass
+
+
+class FetchFailedError(Exception):
+    """A timeline page could not be fetched, even after retries."""
+
+
+@dataclass
+class RequestStat:
+    url: str
+    # None if the request failed before a response was received
+    status: int | None
+    elapsed: float
+    size: int
+    attempt: int
+    # seconds spent in the rate limiter and in the backoff before this attempt
+    waited: float
+    backoff: float = 0.0
+    error: str | None = None
+
+
+def retry_after(response: requests.Response) -> float | None:
+    if (value := response.headers.get("Retry-After")) is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_login_page(response: requests.Response) -> bool:
+    # weibo.cn redirects to the passport login page once the cookie expires
+    parts = urlsplit(response.url)
+    return parts.netloc.startswith("passport.") or "/signin" in parts.path
+
+
+class CrawlClient:
+    def __init__(
+        self,
+        cookies: str,
+        limiter: TokenBucket | None = None,
+        pool_size: int = 4,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        rate_limit_backoff: float = 60.0,
+        archive: Archive | None = None,
+    ) -> None:
+        self.limiter = limiter
+        self.archive = archive
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limit_backoff = rate_limit_backoff
+        self.listeners: list[Callable[[RequestStat], None]] = []
+
+        # one keep-alive session, every thread reuses its pooled connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": user_agent,
+                "Cookie": cookies,
+                "Accept": "text/html",
+            }
+        )
+
+    def __enter__(self) -> "CrawlClient":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def get(self, url: str) -> requests.Response | None:
+        delay = 0.0
+        for attempt in range(self.max_retries + 1):
+            backoff = delay if attempt > 0 else 0.0
+            waited = self.limiter.acquire() if self.limiter is not None else 0.0
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                self._notify(
+                    RequestStat(
+                        url,
+                        None,
+                        time.perf_counter() - start,
+                        0,
+                        attempt,
+                        waited,
+                        backoff,
+                        type(e).__name__,
+                    )
+                )
+                delay = self._delay(self.backoff, attempt)
+                logger.warning(f"get {url} failed: {e!r}, retry after {delay:.1f}s")
+            else:
+                elapsed = time.perf_counter() - start
+                self._notify(
+                    RequestStat(
+                        url,
+                        response.status_code,
+                        elapsed,
+                        len(response.content),
+                        attempt,
+                        waited,
+                        backoff,
+                    )
+                )
+                logger.debug(f"get {url} {response.status_code} in {elapsed:.2f}s")
+                if is_login_page(response):
+                    raise CookieExpiredError(
+                        f"redirected to {response.url}, cookie has expired"
+                    )
+                if response.status_code == 200:
+                    if self.archive is not None:
+                        self.archive.put(url, response.text)
+                    return response
+                if response.status_code in rate_limit_status:
+                    delay = retry_after(response) or self._delay(
+                        self.rate_limit_backoff, attempt
+                    )
+                    logger.warning(
+                        f"get {url} rate limited ({response.status_code}), "
+                        f"retry after {delay:.1f}s"
+                    )
+                elif response.status_code >= 500:
+                    delay = self._delay(self.backoff, attempt)
+                    logger.debug(
+                        f"get {url} failed ({response.status_code}), "
+                        f"retry after {delay:.1f}s"
+                    )
+                else:
+                    logger.error(f"get {url} failed ({response.status_code})")
+                    return None
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        logger.error(f"get {url} failed after {self.max_retries} retries")
+        return None
+
+    def _delay(self, base: float, attempt: int) -> float:
+        # exponential backoff with jitter so that workers do not retry in step
+        return base * 2**attempt * (1 + random.random() / 2)
+
+    def _notify(self, stat: RequestStat) -> None:
+        for listener in self.listeners:
+            listener(stat)
@@ -18,6 +18,40 @@ class SplitUse(StrEnum):
     HANLP = "hanlp"
 
 
+class GroupBy(StrEnum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+
+class ParserBackend(StrEnum):
+    LXML = "lxml"
+    HTML5LIB = "html5lib"
+
+
+@dataclass
+class AccountConfig:
+    uid: str
+    # unset values fall back to the ones of CrawlConfig
+    cookies: str | None = None
+    original_only: bool | None = None
+    after: datetime | None = None
+    output: Path | None = None
+
+
+@dataclass
+class RenderVariant:
+    output: Path
+    # unset values fall back to the ones of GenerateConfig
+    font: Path | None = None
+    mask: Path | None = None
+    colormap: str | None = None
+    max_word: int | None = None
+    scale: float | None = None
+
+
 @dataclass
 class CrawlConfig:
     uid: str | None = None
@@ -27,6 +61,26 @@ class CrawlConfig:
     max_page: int = -1
     after: datetime = datetime(datetime.now().year, 1, 1)
     output: Path = Path("weibo.jsonl").resolve()
+    incremental: bool = False
+    interval: float = 4.0
+    burst: int = 1
+    adaptive: bool = True
+    min_interval: float = 1.0
+    max_interval: float = 60.0
+    workers: int = 4
+    timeout: float = 30.0
+    max_retries: int = 3
+    parser: ParserBackend = ParserBackend.LXML
+    archive: Path | None = None
+    accounts: list[AccountConfig] = field(default_factory=list)
+    batch_workers: int = 4
+    partitions: int = 1
+    partition_cookies: list[str] = field(default_factory=list)
+    metrics: Path | None = None
+    prometheus: Path | None = None
+    progress_interval: float = 60.0
+    fsync_interval: float = 10.0
+    store: Path | None = None
 
 
 @dataclass
@@ -40,6 +94,18 @@ class GenerateConfig:
     max_word: int = 400
     output: Path = Path("weibo.png").resolve()
     split_use: SplitUse = SplitUse.JIEBA
+    workers: int = 1
+    batch_size: int = 32
+    batch_max_chars: int = 4096
+    chunk_size: int = 10000
+    cache: Path | None = None
+    colormap: str = "ocean"
+    scale: float = 2.0
+    variants: list[RenderVariant] = field(default_factory=list)
+    group_by: GroupBy | None = None
+    aggregate: Path | None = None
+    stopwords: Path | None = None
+    exclude: Path | None = None
 
 
 @dataclass
@@ -70,6 +136,8 @@ def init_config(config_file: Path) -> Config:
             type_hooks={
                 Path: lambda s: Path(s).resolve(),
                 SplitUse: lambda s: SplitUse(s),
+                ParserBackend: lambda s: ParserBackend(s),
+                GroupBy: lambda s: GroupBy(s),
             }
         ),
     )
@@ -0,0 +1,97 @@
+import json
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from wwg.config import GroupBy
+from wwg.store import CorpusStore, is_store
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    loads: Callable[[str], Any] = orjson.loads
+except ImportError:
+    loads = json.loads
+
+time_format = "%Y-%m-%dT%H:%M:%S"
+# Weibo.__str__ writes create_at last, in the fixed format above
+create_at_prefix = '"create_at": "'
+create_at_length = len("2024-01-01T00:00:00")
+
+
+def create_at_text(line: str) -> str | None:
+    """create_at of a corpus line without decoding it, None if not found."""
+    start = line.rfind(create_at_prefix)
+    if start < 0:
+        return None
+    start += len(create_at_prefix)
+    text = line[start : start + create_at_length]
+    if len(text) != create_at_length or text[10] != "T":
+        return None
+    return text
+
+
+def period_of(create_at: str, group_by: GroupBy) -> str:
+    """Period a create_at, or a day like 2024-05-01, falls into."""
+    day = date.fromisoformat(create_at[:10])
+    if group_by == GroupBy.DAY:
+        return day.isoformat()
+    if group_by == GroupBy.WEEK:
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if group_by == GroupBy.QUARTER:
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    if group_by == GroupBy.YEAR:
+        return f"{day.year}"
+    return f"{day.year}-{day.month:02d}"
+
+
+def read_posts(
+    path: Path, after: datetime | None = None, before: datetime | None = None
+) -> Iterator[dict[str, Any]]:
+    """Posts of a corpus created within [after, before], read lazily.
+
+    A sqlite corpus store is read through its create_at index. In a JSONL
+    file, lines whose create_at is out of range are skipped by comparing the
+    raw text, which orders like the datetime for the fixed format, so only
+    posts in range are decoded.
+    """
+    if is_store(path):
+        with CorpusStore(path) as store:
+            yield from store.posts(after, before)
+        return
+    # isoformat keeps the microseconds of a bound, "12:00:00" sorts before
+    # "12:00:00.5" just as the datetimes do
+    low = after.isoformat() if after is not None else None
+    high = before.isoformat() if before is not None else None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if (line := line.strip()) == "":
+                continue
+            if (text := create_at_text(line)) is not None and (
+                (low is not None and text < low) or (high is not None and text > high)
+            ):
+                continue
+            try:
+                post = loads(line)
+                create_at = datetime.strptime(post["create_at"], time_format)
+            # decode errors of json and orjson are ValueErrors
+            except (KeyError, TypeError, ValueError):
+                logger.error(f"cannot parse {line}")
+                continue
+            if (after is not None and create_at < after) or (
+                before is not None and create_at > before
+            ):
+                continue
+            yield post
+
+
+def index(source: Path, store: Path, uid: str | None = None) -> int:
+    """Upsert the posts of a JSONL file into a corpus store."""
+    with CorpusStore(store) as corpus:
+        count = corpus.upsert(read_posts(source), uid)
+        logger.info(f"indexed {count} posts of {source}, {len(corpus)} in {store}")
+    return count
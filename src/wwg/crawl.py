@@ -1,211 +1,607 @@
 import json
 import logging
-import random
-import re
+import threading
 import time
-from dataclasses import asdict, dataclass
+from collections import Counter
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from contextlib import ExitStack
+from dataclasses import dataclass, replace
 from datetime import datetime
-from typing import Callable, Generator
+from itertools import repeat
+from pathlib import Path
+from typing import Generator
 
-import requests
-from bs4 import BeautifulSoup, Tag
-
-from wwg.config import CrawlConfig
+from wwg.archive import Archive
+from wwg.client import CookieExpiredError, CrawlClient, FetchFailedError
+from wwg.config import AccountConfig, CrawlConfig, ParserBackend
+from wwg.metrics import CrawlMetrics
+from wwg.parser import PageParser, ParsedPage, Weibo, get_parser
+from wwg.ratelimit import AdaptiveTokenBucket, TokenBucket
+from wwg.store import CorpusStore
+from wwg.timing import StageTimer
+from wwg.writer import Checkpoint, PageWriter, checkpoint_path, write_jsonl
 
 logger = logging.getLogger(__name__)
-time_pattern = r"(?:(?:今天)|(?:(?P<month>\d\d)月(?P<day>\d\d)日)|(?:(?P<yyyy>\d\d\d\d)-(?P<MM>\d\d)-(?P<dd>\d\d)))\s(?P<HH>\d\d):(?P<mm>\d\d)(?::(?P<ss>\d\d))?.*"  # noqa
 base_url = "https://weibo.cn"
 
 
+def load_known_ids(path: Path) -> set[str]:
+    result: set[str] = set()
+    if not path.exists():
+        return result
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if (line := line.strip()) == "":
+                continue
+            try:
+                result.add(json.loads(line)["id"])
+            except (json.JSONDecodeError, KeyError):
+                logger.warning(f"cannot read weibo id from {line}")
+    return result
+
+
 @dataclass
-class Weibo:
-    id: str
-    content: str
-    create_at: datetime
+class CrawlSummary:
+    uid: str
+    posts: int = 0
+    pages: int = 0
+    elapsed: float = 0.0
 
-    def __str__(self) -> str:
-        d = asdict(self)
-        d["create_at"] = self.create_at.strftime("%Y-%m-%dT%H:%M:%S")
-        return json.dumps(d, ensure_ascii=False)
+    @property
+    def posts_per_minute(self) -> float:
+        return self.posts / self.elapsed * 60 if self.elapsed > 0 else 0.0
 
 
-def retry_get(
-    url: str,
-    headers: dict[str, str],
-    predictor: Callable[[requests.Response], bool],
-    max_retries: int = 3,
-) -> requests.Response | None:
-    response = requests.get(url, headers=headers)
-    i = 0
-    wait_time = 1
-    while i < max_retries and not predictor(response):
-        logger.debug(f"get {url} failed, retry after {wait_time}s")
-        time.sleep(wait_time)
-        wait_time *= 2
-        response = requests.get(url, headers=headers)
-        i += 1
-    return response if predictor(response) else None
-
-
-def weibo_predictor(tag: Tag) -> bool:
-    return (
-        tag.name == "div"
-        and tag.has_attr("class")
-        and "c" in tag.attrs["class"]
-        and tag.has_attr("id")
-        and tag.attrs["id"].startswith("M_")
+def create_limiter(config: CrawlConfig) -> TokenBucket:
+    if config.adaptive:
+        return AdaptiveTokenBucket(
+            config.interval, config.burst, config.min_interval, config.max_interval
+        )
+    return TokenBucket(config.interval, config.burst)
+
+
+def create_client(
+    config: CrawlConfig,
+    cookies: str | None,
+    limiter: TokenBucket,
+    archive: Archive | None,
+    metrics: CrawlMetrics | None = None,
+    sharing: int = 1,
+) -> CrawlClient:
+    client = CrawlClient(
+        cookies if cookies is not None else "",
+        limiter,
+        pool_size=max(1, config.workers) * sharing + 1,
+        timeout=config.timeout,
+        max_retries=config.max_retries,
+        archive=archive,
     )
+    if isinstance(limiter, AdaptiveTokenBucket):
+        client.listeners.append(lambda stat: limiter.observe(stat.status, stat.elapsed))
+    if metrics is not None:
+        client.listeners.append(metrics.observe_request)
+    return client
+
+
+def main(config: CrawlConfig) -> CrawlSummary:
+    # every request, listing page or full text, takes a token from one bucket
+    limiter = create_limiter(config)
+    metrics = CrawlMetrics(config.progress_interval, config.metrics)
+    timer = StageTimer()
+    with ExitStack() as stack:
+        with timer.stage("open"):
+            archive = (
+                stack.enter_context(Archive(config.archive))
+                if config.archive is not None
+                else None
+            )
+            client = stack.enter_context(
+                create_client(config, config.cookies, limiter, archive, metrics)
+            )
+            store = (
+                stack.enter_context(CorpusStore(config.store))
+                if config.store is not None
+                else None
+            )
+        with timer.stage("crawl"):
+            summary = crawl_timeline(config, client, metrics, store)
+        # pages are parsed as they arrive, report the parse time on its own
+        timer.split("crawl", "parse", metrics.parse_time)
+    with timer.stage("export"):
+        log_summary([summary])
+        metrics.export(config.prometheus)
+    timer.log("crawl")
+    return summary
+
+
+def batch(config: CrawlConfig) -> list[CrawlSummary]:
+    configs = [account_config(config, account) for account in config.accounts]
+    # accounts crawled with the same cookie share one session and rate budget
+    sharing = Counter(c.cookies for c in configs)
+    summaries: list[CrawlSummary] = []
+    metrics = CrawlMetrics(config.progress_interval, config.metrics)
+    timer = StageTimer()
+    with ExitStack() as stack:
+        with timer.stage("open"):
+            archive = (
+                stack.enter_context(Archive(config.archive))
+                if config.archive is not None
+                else None
+            )
+            clients = {
+                cookies: stack.enter_context(
+                    create_client(
+                        config,
+                        cookies,
+                        create_limiter(config),
+                        archive,
+                        metrics,
+                        count,
+                    )
+                )
+                for cookies, count in sharing.items()
+            }
+            store = (
+                stack.enter_context(CorpusStore(config.store))
+                if config.store is not None
+                else None
+            )
+            executor = stack.enter_context(
+                ThreadPoolExecutor(
+                    max_workers=max(1, config.batch_workers),
+                    thread_name_prefix="wwg-account",
+                )
+            )
+        with timer.stage("crawl"):
+            futures = [
+                (
+                    c.uid,
+                    executor.submit(
+                        crawl_timeline, c, clients[c.cookies], metrics, store
+                    ),
+                )
+                for c in configs
+            ]
+            for uid, future in futures:
+                try:
+                    summaries.append(future.result())
+                except (CookieExpiredError, FetchFailedError) as e:
+                    logger.error(f"crawl {uid} failed: {e}")
+        timer.split("crawl", "parse", metrics.parse_time)
+    with timer.stage("export"):
+        log_summary(summaries)
+        metrics.export(config.prometheus)
+    timer.log("crawl")
+    return summaries
 
 
-def repost_predictor(tag: Tag) -> bool:
-    return (
-        tag.has_attr("class")
-        and "cmt" in tag.attrs["class"]
-        and tag.text.startswith("转发理由")
+def backfill(config: CrawlConfig) -> CrawlSummary:
+    if config.max_page < config.start_page:
+        raise ValueError("backfill needs max_page to split the page range")
+    start = time.perf_counter()
+    ranges = split_pages(config.start_page, config.max_page, config.partitions)
+    cookies = [c for c in [config.cookies, *config.partition_cookies] if c]
+    # named after the uid and the page range, so that a rerun of the same
+    # backfill finds the shards it already completed
+    shards = [
+        config.output.with_name(f"{config.output.name}.{config.uid}.{first}-{last}")
+        for first, last in ranges
+    ]
+    summaries: list[CrawlSummary] = []
+    metrics = CrawlMetrics(config.progress_interval, config.metrics)
+    timer = StageTimer()
+    with ExitStack() as stack:
+        with timer.stage("open"):
+            archive = (
+                stack.enter_context(Archive(config.archive))
+                if config.archive is not None
+                else None
+            )
+            store = (
+                stack.enter_context(CorpusStore(config.store))
+                if config.store is not None
+                else None
+            )
+            # partitions on the same cookie share its rate budget
+            limiters = {c: create_limiter(config) for c in cookies}
+            executor = stack.enter_context(
+                ThreadPoolExecutor(
+                    max_workers=len(ranges), thread_name_prefix="wwg-range"
+                )
+            )
+        with timer.stage("crawl"):
+            # set when a partition fails, the others stop after their current page
+            stop = threading.Event()
+            futures = []
+            for i, (first, last) in enumerate(ranges):
+                if shards[i].exists() and not checkpoint_path(shards[i]).exists():
+                    logger.info(f"partition {i}: page {first} to {last} is complete")
+                    continue
+                part = replace(
+                    config,
+                    start_page=first,
+                    max_page=last,
+                    output=shards[i],
+                    incremental=False,
+                    accounts=[],
+                )
+                cookie = cookies[i % len(cookies)]
+                # every partition has its own session
+                client = stack.enter_context(
+                    create_client(part, cookie, limiters[cookie], archive, metrics)
+                )
+                logger.info(f"partition {i}: page {first} to {last}")
+                futures.append(
+                    executor.submit(crawl_timeline, part, client, metrics, store, stop)
+                )
+            for future in as_completed(futures):
+                if (error := future.exception()) is not None:
+                    stop.set()
+                    # raised once the other partitions saved their checkpoints
+                    raise error
+                summaries.append(future.result())
+        timer.split("crawl", "parse", metrics.parse_time)
+    with timer.stage("merge"):
+        posts = merge_shards(shards, config.output)
+        for shard in shards:
+            shard.unlink(missing_ok=True)
+    summary = CrawlSummary(
+        config.uid if config.uid is not None else "",
+        posts,
+        sum(s.pages for s in summaries),
+        time.perf_counter() - start,
     )
+    with timer.stage("export"):
+        log_summary(summaries + [summary])
+        metrics.export(config.prometheus)
+    timer.log("crawl")
+    return summary
 
 
-def content_predictor(tag: Tag) -> bool:
-    return tag.name == "span" and tag.has_attr("class") and "ctt" in tag.attrs["class"]
+def split_pages(first: int, last: int, parts: int) -> list[tuple[int, int]]:
+    parts = max(1, min(parts, last - first + 1))
+    size, rest = divmod(last - first + 1, parts)
+    result = []
+    for i in range(parts):
+        end = first + size + (1 if i < rest else 0) - 1
+        result.append((first, end))
+        first = end + 1
+    return result
 
 
-def create_time_predictor(tag: Tag) -> bool:
-    return tag.name == "span" and tag.has_attr("class") and "ct" in tag.attrs["class"]
+def merge_shards(shards: list[Path], output: Path) -> int:
+    # keep the first copy of a post, shards are in page order
+    lines: dict[str, tuple[str, str]] = {}
+    for shard in shards:
+        if not shard.exists():
+            continue
+        with open(shard, "r", encoding="utf-8") as f:
+            for line in f:
+                if (line := line.strip()) == "":
+                    continue
+                try:
+                    content = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.error(f"cannot parse {line}")
+                    continue
+                if content["id"] not in lines:
+                    lines[content["id"]] = (content["create_at"], line)
+    # newest first like the timeline, create_at sorts as a string
+    merged = sorted(lines.values(), key=lambda x: x[0], reverse=True)
+    write_jsonl(output, (line for _, line in merged))
+    logger.info(f"merged {len(merged)} posts from {len(shards)} shards into {output}")
+    return len(merged)
 
 
-def full_text_predictor(tag: Tag) -> bool:
-    return tag.name == "a" and tag.has_attr("href") and tag.text.strip() == "全文"
+def account_config(config: CrawlConfig, account: AccountConfig) -> CrawlConfig:
+    return replace(
+        config,
+        uid=account.uid,
+        cookies=account.cookies if account.cookies is not None else config.cookies,
+        original_only=(
+            account.original_only
+            if account.original_only is not None
+            else config.original_only
+        ),
+        after=account.after if account.after is not None else config.after,
+        # one output shard per account next to crawl.output
+        output=(
+            account.output
+            if account.output is not None
+            else config.output.with_name(
+                f"{config.output.stem}.{account.uid}{config.output.suffix}"
+            )
+        ),
+        accounts=[],
+    )
 
 
-def next_page_predictor(tag: Tag) -> bool:
-    return tag.name == "a" and tag.has_attr("href") and tag.text.strip() == "下页"
+def log_summary(summaries: list[CrawlSummary]) -> None:
+    logger.info(f"{'uid':<16}{'posts':>8}{'pages':>8}{'elapsed':>10}{'posts/min':>11}")
+    for s in summaries:
+        logger.info(
+            f"{s.uid:<16}{s.posts:>8}{s.pages:>8}"
+            f"{s.elapsed:>9.1f}s{s.posts_per_minute:>11.1f}"
+        )
 
 
-def main(config: CrawlConfig) -> None:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36 Edg/118.0.2088.33",  # noqa
-        "Cookie": config.cookies if config.cookies is not None else "",
-        "Accept": "text/html",
-    }
+def crawl_timeline(
+    config: CrawlConfig,
+    client: CrawlClient,
+    metrics: CrawlMetrics | None = None,
+    store: CorpusStore | None = None,
+    stop: threading.Event | None = None,
+) -> CrawlSummary:
+    start = time.perf_counter()
+    summary = CrawlSummary(config.uid if config.uid is not None else "")
     url = f"{base_url}/{config.uid}/profile"
     if config.start_page > 1:
         url = f"{url}?page={config.start_page}"
-    with open(config.output, "w", encoding="utf-8") as f:
-        current_page = config.start_page
+    parser = get_parser(config.parser)
+    with (
+        PageWriter(config.output, config.incremental, config.fsync_interval) as writer,
+        ThreadPoolExecutor(
+            max_workers=max(1, config.workers), thread_name_prefix="wwg-full-text"
+        ) as executor,
+    ):
+        # a checkpoint left by an interrupted crawl overrides the start page
+        checkpoint = writer.open(Checkpoint(url, config.start_page))
+        if checkpoint.url != url or checkpoint.page != config.start_page:
+            logger.info(
+                f"resume {config.uid} from page {checkpoint.page}: {checkpoint.url}"
+            )
+        url, current_page, last_id = checkpoint.url, checkpoint.page, checkpoint.last_id
+        known_ids: set[str] | None = None
+        if config.incremental:
+            known_ids = load_known_ids(config.output)
+            logger.info(
+                f"incremental crawl of {config.uid}, "
+                f"{len(known_ids)} posts already stored"
+            )
         flag = True
+        page_weibos: list[Weibo] = []
         while flag and (config.max_page < 0 or current_page <= config.max_page):
-            weibo_iter = crawl_page(url, headers, config.original_only)
+            if stop is not None and stop.is_set():
+                # not finished, the checkpoint is kept to resume from this page
+                logger.info(f"stop crawling {config.uid} at page {current_page}")
+                summary.elapsed = time.perf_counter() - start
+                return summary
+            weibo_iter = crawl_page(
+                url, client, parser, config.original_only, known_ids, executor, metrics
+            )
+            summary.pages += 1
+            page_url, page_weibos = url, []
             try:
                 while True:
                     weibo = next(weibo_iter)
                     if weibo.create_at < config.after:
                         flag = False
                         break
-                    f.write(f"{weibo}\n")
+                    writer.write(weibo)
+                    summary.posts += 1
+                    page_weibos.append(weibo)
+                    if metrics is not None:
+                        metrics.observe_post(summary.uid, weibo.create_at, config.after)
+                    last_id = weibo.id
+                    if known_ids is not None:
+                        known_ids.add(weibo.id)
             except StopIteration as e:
                 if isinstance((next_url := e.value), str):
                     url = f"{base_url}{next_url}"
                 else:
                     break
+            finally:
+                # a post older than after stops in the middle of the page, the
+                # full text fetches still queued for it are cancelled here
+                # rather than run when the executor shuts down
+                weibo_iter.close()
+                if metrics is not None:
+                    metrics.observe_page(summary.uid, page_url, len(page_weibos))
             current_page += 1
-            # sleep 2~3 s
-            time.sleep(3 + random.random() * 2)
+            writer.commit(url, current_page, last_id)
+            if store is not None:
+                store.upsert((weibo.to_dict() for weibo in page_weibos), config.uid)
+                page_weibos = []
+        writer.finish()
+        # the last page ends the loop before its commit
+        if store is not None and page_weibos:
+            store.upsert((weibo.to_dict() for weibo in page_weibos), config.uid)
+    summary.elapsed = time.perf_counter() - start
+    return summary
+
+
+def replay(config: CrawlConfig) -> None:
+    if config.archive is None or not config.archive.exists():
+        raise FileNotFoundError(f"cannot find archive {config.archive}")
+    prefix = f"{base_url}/{config.uid}/profile"
+    posts: dict[str, Weibo] = {}
+    full_text: dict[str, str] = {}
+    timer = StageTimer()
+    # nothing is rate limited offline, parse on every core
+    with Archive(config.archive) as archive, ProcessPoolExecutor() as executor:
+        with timer.stage("parse"):
+            listing = archive.pages(prefix)
+            logger.info(f"replay {len(listing)} archived pages of {config.uid}")
+            # pages are ordered by fetch time, a later fetch overrides earlier ones
+            for page in executor.map(
+                replay_page,
+                repeat(config.archive),
+                [p.rowid for p in listing],
+                [p.fetched_at for p in listing],
+                repeat(config.parser),
+                chunksize=16,
+            ):
+                for post in page.posts:
+                    if config.original_only and post.repost:
+                        continue
+                    if post.full_text is not None:
+                        full_text[post.id] = f"{base_url}{post.full_text}"
+                        posts.pop(post.id, None)
+                    elif post.weibo is not None:
+                        posts[post.id] = post.weibo
+                        full_text.pop(post.id, None)
+
+        with timer.stage("full text"):
+            weibo_ids, full_text_pages = [], []
+            for weibo_id, url in full_text.items():
+                if (archived := archive.latest(url)) is None:
+                    logger.warning(f"full text of weibo {weibo_id} is not archived")
+                    continue
+                weibo_ids.append(weibo_id)
+                full_text_pages.append(archived)
+            for weibo_id, weibo in zip(
+                weibo_ids,
+                executor.map(
+                    replay_full_text,
+                    repeat(config.archive),
+                    weibo_ids,
+                    [p.rowid for p in full_text_pages],
+                    [p.fetched_at for p in full_text_pages],
+                    repeat(config.parser),
+                    chunksize=16,
+                ),
+            ):
+                if weibo is not None:
+                    posts[weibo_id] = weibo
+
+    with timer.stage("export"):
+        weibo_list = sorted(
+            (weibo for weibo in posts.values() if weibo.create_at >= config.after),
+            key=lambda weibo: weibo.create_at,
+            reverse=True,
+        )
+        write_jsonl(config.output, (str(weibo) for weibo in weibo_list))
+        logger.info(f"replayed {len(weibo_list)} posts into {config.output}")
+        if config.store is not None:
+            with CorpusStore(config.store) as store:
+                store.upsert((weibo.to_dict() for weibo in weibo_list), config.uid)
+    timer.log("replay")
+
+
+# archives opened by a replay worker process, reused across tasks
+replay_archives: dict[Path, Archive] = {}
+
+
+def open_replay_archive(path: Path) -> Archive:
+    if path not in replay_archives:
+        replay_archives[path] = Archive(path)
+    return replay_archives[path]
+
+
+def replay_page(
+    path: Path, rowid: int, fetched_at: datetime, backend: ParserBackend
+) -> ParsedPage:
+    html = open_replay_archive(path).read(rowid)
+    return get_parser(backend).parse_page(html, fetched_at)
+
+
+def replay_full_text(
+    path: Path, weibo_id: str, rowid: int, fetched_at: datetime, backend: ParserBackend
+) -> Weibo | None:
+    html = open_replay_archive(path).read(rowid)
+    return get_parser(backend).parse_full_text(weibo_id, html, fetched_at)
 
 
 def crawl_page(
-    url: str, headers: dict[str, str], original_only: bool
+    url: str,
+    client: CrawlClient,
+    parser: PageParser,
+    original_only: bool,
+    known_ids: set[str] | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    metrics: CrawlMetrics | None = None,
 ) -> Generator[Weibo, None, str | None]:
-    if (
-        response := retry_get(url, headers, lambda r: r.status_code == 200)
-    ) is not None:
-        soup = BeautifulSoup(
-            response.text.removeprefix('<?xml version="1.0" encoding="UTF-8"?>'),
-            "html5lib",
-        )
-        weibo_list: list[Tag] = soup.find_all(weibo_predictor)
-        for weibo in weibo_list:
-            if original_only and len(weibo.find_all(repost_predictor)) > 0:
-                continue
-            weibo_id = weibo.attrs["id"].removeprefix("M_")
-            if (
-                full_text := weibo.find(full_text_predictor)
-            ) is not None and isinstance(full_text, Tag):
-                yield from crawl_full_text(
-                    weibo_id, f"{base_url}{full_text.attrs['href']}", headers
-                )
-                time.sleep(3 + random.random() * 2)
-            elif (result := parse_weibo(weibo_id, weibo)) is not None:
-                yield result
-            else:
-                logger.warning(f"parse weibo {weibo_id} failed")
-        if (next_page := soup.find(next_page_predictor)) is not None and isinstance(
-            next_page, Tag
+    if (response := client.get(url)) is not None:
+        start = time.perf_counter()
+        page = parser.parse_page(response.text)
+        if metrics is not None:
+            metrics.observe_parse("page", time.perf_counter() - start)
+        # skipped reposts are never stored, they cannot be known
+        stored = [post for post in page.posts if not (original_only and post.repost)]
+        if (
+            known_ids is not None
+            and len(stored) > 0
+            and all(post.id in known_ids for post in stored)
         ):
-            return next_page.attrs["href"]
-        else:
-            logger.debug("cannot find next page href")
+            logger.info(f"all posts on {url} are already stored, stop paging")
             return None
+        # full text pages are fetched in the background, results are kept in
+        # timeline order and yielded one by one
+        results: list[Future[list[Weibo]] | list[Weibo]] = []
+        try:
+            for post in page.posts:
+                if original_only and post.repost:
+                    continue
+                if known_ids is not None and post.id in known_ids:
+                    continue
+                if post.full_text is not None:
+                    full_text_url = f"{base_url}{post.full_text}"
+                    if executor is not None:
+                        results.append(
+                            executor.submit(
+                                fetch_full_text,
+                                post.id,
+                                full_text_url,
+                                client,
+                                parser,
+                                metrics,
+                            )
+                        )
+                    else:
+                        results.append(
+                            fetch_full_text(
+                                post.id, full_text_url, client, parser, metrics
+                            )
+                        )
+                elif post.weibo is not None:
+                    results.append([post.weibo])
+                else:
+                    logger.warning(f"parse weibo {post.id} failed")
+            for item in results:
+                yield from item.result() if isinstance(item, Future) else item
+        finally:
+            # the consumer may stop early, drop full text fetches not started yet
+            for item in results:
+                if isinstance(item, Future):
+                    item.cancel()
+        if page.next_page is None:
+            logger.debug("cannot find next page href")
+        return page.next_page
     else:
-        logger.error(f"crawl page {url} failed")
-        return None
+        # unlike a missing next page this is not the end of the timeline, the
+        # output must not be published and the checkpoint is kept to resume
+        raise FetchFailedError(f"crawl page {url} failed")
+
+
+def fetch_full_text(
+    weibo_id: str,
+    url: str,
+    client: CrawlClient,
+    parser: PageParser,
+    metrics: CrawlMetrics | None = None,
+) -> list[Weibo]:
+    return list(crawl_full_text(weibo_id, url, client, parser, metrics))
 
 
 def crawl_full_text(
-    weibo_id: str, url: str, headers: dict[str, str]
+    weibo_id: str,
+    url: str,
+    client: CrawlClient,
+    parser: PageParser,
+    metrics: CrawlMetrics | None = None,
 ) -> Generator[Weibo, None, None]:
-    if (
-        response := retry_get(url, headers, lambda r: r.status_code == 200)
-    ) is not None:
-        soup = BeautifulSoup(
-            response.text.removeprefix('<?xml version="1.0" encoding="UTF-8"?>'),
-            "html5lib",
-        )
-        if (
-            (weibo := soup.find(weibo_predictor)) is not None
-            and isinstance(weibo, Tag)
-            and (result := parse_weibo(weibo_id, weibo)) is not None
-        ):
+    if (response := client.get(url)) is not None:
+        start = time.perf_counter()
+        result = parser.parse_full_text(weibo_id, response.text)
+        if metrics is not None:
+            metrics.observe_parse("full_text", time.perf_counter() - start)
+        if result is not None:
             yield result
     else:
         logger.error(f"crawl weibo {weibo_id} full text failed")
     return None
-
-
-def parse_weibo(weibo_id: str, weibo: Tag) -> Weibo | None:
-    if (content := weibo.find(content_predictor)) is not None and (
-        create_time := weibo.find(create_time_predictor)
-    ) is not None:
-        return Weibo(
-            weibo_id,
-            content.get_text(separator="\n", strip=True).removeprefix(":"),
-            parse_time(create_time.text.strip()),
-        )
-    else:
-        logger.error(f"parse weibo {weibo_id} failed: {weibo}")
-        return None
-
-
-def parse_time(s: str) -> datetime:
-    now = datetime.now()
-    if (match := re.match(time_pattern, s)) is not None:
-        return datetime(
-            int(y) if (y := match.group("yyyy")) is not None else now.year,
-            (
-                int(m)
-                if (m := match.group("MM")) is not None
-                or (m := match.group("month")) is not None
-                else now.month
-            ),
-            (
-                int(d)
-                if (d := match.group("dd")) is not None
-                or (d := match.group("day")) is not None
-                else now.day
-            ),
-            int(match.group("HH")),
-            int(match.group("mm")),
-            int(s) if (s := match.group("ss")) is not None else 0,
-        )
-
-    logger.warning(f"cannot parse create time: {s}, return datetime.now() instead.")
-    return now
@@ -0,0 +1,76 @@
+import hashlib
+import re
+from functools import lru_cache
+from importlib.resources import files
+from pathlib import Path
+from string import punctuation
+
+import wwg
+
+DEFAULT_EXCLUDE = frozenset({"网页链接", "网页", "链接", "jpg", ".jpg"})
+
+
+@lru_cache(maxsize=1)
+def get_stopwords() -> frozenset[str]:
+    result = set(
+        files(wwg).joinpath("stopwords.txt").read_text(encoding="utf-8").split("\n")
+    )
+    for p in punctuation:
+        result.add(p)
+    for p in "，。？《》；：”“’‘【】、——（）……￥！·「」":
+        result.add(p)
+    result.add(" ")
+    result.add("\n")
+    return frozenset(result)
+
+
+def read_words(path: Path) -> set[str]:
+    # one word per line, like stopwords.txt and the custom dict
+    return {
+        word
+        for line in path.read_text(encoding="utf-8").split("\n")
+        if (word := line.strip()) != ""
+    }
+
+
+class TokenFilter:
+    """Token filter applied to every segmented post in a single pass.
+
+    Drops empty and single character tokens, stopwords, excluded words and
+    tokens made of stopword characters only, such as "……" or "!?".
+    """
+
+    def __init__(
+        self,
+        stopwords: frozenset[str] | None = None,
+        exclude: frozenset[str] = DEFAULT_EXCLUDE,
+    ) -> None:
+        if stopwords is None:
+            stopwords = get_stopwords()
+        self.drop = stopwords | exclude
+        chars = sorted(word for word in stopwords if len(word) == 1)
+        self.stop_chars = re.compile(
+            f"[{''.join(re.escape(c) for c in chars)}]+" if chars else "(?!)"
+        )
+
+    @classmethod
+    def from_files(
+        cls, stopwords: Path | None = None, exclude: Path | None = None
+    ) -> "TokenFilter":
+        """Defaults extended with the words of the given files."""
+        return cls(
+            get_stopwords() | read_words(stopwords) if stopwords else None,
+            DEFAULT_EXCLUDE | read_words(exclude) if exclude else DEFAULT_EXCLUDE,
+        )
+
+    def __call__(self, word_list: list[str]) -> list[str]:
+        drop, stop_chars = self.drop, self.stop_chars.fullmatch
+        return [
+            word
+            for word in word_list
+            if len(word) > 1 and word not in drop and stop_chars(word) is None
+        ]
+
+    def fingerprint(self) -> str:
+        """Identifies the words this filter drops."""
+        return hashlib.sha256("\n".join(sorted(self.drop)).encode("utf-8")).hexdigest()
@@ -1,190 +1,375 @@
-import json
 import logging
-from collections import Counter
-from datetime import datetime
-from importlib.resources import files
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
-from string import punctuation
+from typing import Iterable, Iterator, TypeVar
 
-import hanlp
-import hanlp.pretrained
-import jieba
 import numpy as np
-import pkuseg
-import thulac
 import typer
-import wordcloud
-from hanlp.common.component import Component
 from numpy.typing import NDArray
-from PIL import Image
 
-import wwg
-from wwg.config import GenerateConfig, SplitUse
+from wwg.aggregate import DayAggregates
+from wwg.cache import TokenCache
+from wwg.config import GenerateConfig, GroupBy
+from wwg.corpus import period_of, read_posts
+from wwg.filters import TokenFilter
+from wwg.render import create_cloud, render, render_periods, render_specs
+from wwg.segment import Segmenter, get_segmenter
+from wwg.timing import StageTimer, Timed
 
 logger = logging.getLogger(__name__)
 
-jieba.setLogLevel(logging.ERROR)
-
-
-def get_stopwords() -> set[str]:
-    result = set(
-        files(wwg).joinpath("stopwords.txt").read_text(encoding="utf-8").split("\n")
-    )
-    for p in punctuation:
-        result.add(p)
-    for p in "，。？《》；：”“’‘【】、——（）……￥！·「」":
-        result.add(p)
-    result.add(" ")
-    result.add("\n")
-    return result
+T = TypeVar("T")
 
 
 def main(config: GenerateConfig) -> None:
     if config.input is None or not config.input.exists() or not config.input.is_file():
         raise typer.BadParameter(f"cannor read input file {config.input}")
 
-    hantok = hanlp.load(hanlp.pretrained.tok.COARSE_ELECTRA_SMALL_ZH)
-    hantok.dict_force = None  # type: ignore
-    hantok.dict_combine = None  # type: ignore
-    if config.custom_dict is not None:
-        logger.debug(f"load custom_dict from {config.custom_dict}")
-        dict_content = set(config.custom_dict.read_text(encoding="utf-8").split("\n"))
-        jieba.load_userdict(str(config.custom_dict))
-        thu = thulac.thulac(
-            user_dict=str(config.custom_dict),
-            seg_only=True,
-            filt=True,
-            rm_space=True,
-            T2S=True,
-        )
-        pku = pkuseg.pkuseg(model_name="web", user_dict=str(config.custom_dict))
-        hantok.dict_force = dict_content  # type: ignore
-    else:
-        thu = thulac.thulac(seg_only=True, filt=True, rm_space=True, T2S=True)
-        pku = pkuseg.pkuseg(model_name="web")
-
-    weibo_list = config.input.read_text(encoding="utf-8").split("\n")
-    weibo_list = [weibo.strip() for weibo in weibo_list]
-    weibo_list = [weibo for weibo in weibo_list if weibo != ""]
-
-    word_list = split_word(
-        weibo_list, config.before, config.after, config.split_use, thu, pku, hantok
+    # only the chosen backend is imported and loaded, on its first cut
+    segmenter = get_segmenter(
+        config.split_use,
+        config.custom_dict,
+        config.batch_size,
+        config.batch_max_chars,
     )
-
-    mask = None
-    if config.mask is not None and config.mask.exists():
-        img = Image.open(str(config.mask)).convert("RGB")
-        mask = np.array(img)
-        logger.debug(f"load mask from {config.mask}")
-
-    generate_wordcloud(word_list, config.output, config.max_word, config.font, mask)
-
-
-def split_use_jieba(content: str) -> list[str]:
-    return jieba.lcut(content, cut_all=True, HMM=True)
+    # built once, applied to the tokens of every post as they are counted
+    token_filter = TokenFilter.from_files(config.stopwords, config.exclude)
+    timer = StageTimer()
+
+    with (
+        (
+            TokenCache(config.cache, segmenter)
+            if config.cache is not None
+            else nullcontext()
+        ) as cache,
+        (
+            DayAggregates(
+                config.aggregate,
+                f"{segmenter.fingerprint()}:{token_filter.fingerprint()}",
+            )
+            if config.aggregate is not None
+            else nullcontext()
+        ) as aggregates,
+    ):
+        if aggregates is not None:
+            with timer.stage("update aggregates"):
+                update_aggregates(
+                    aggregates,
+                    config.input,
+                    segmenter,
+                    token_filter,
+                    config.workers,
+                    cache,
+                    config.chunk_size,
+                )
+            timer.split("update aggregates", "load model", segmenter.load_seconds)
+            with timer.stage("sum aggregates"):
+                counters = aggregates.counters(
+                    config.after, config.before, config.group_by
+                )
+        else:
+            # posts are read as they are segmented, only the counts are kept
+            weibo_list = Timed(read_posts(config.input, config.after, config.before))
+            with timer.stage("segment"):
+                counters = count_periods(
+                    weibo_list,
+                    config.group_by,
+                    segmenter,
+                    token_filter,
+                    config.workers,
+                    cache,
+                    config.chunk_size,
+                )
+            timer.split("segment", "read", weibo_list.seconds)
+            timer.split("segment", "load model", segmenter.load_seconds)
+    with timer.stage("clean"):
+        tables = {
+            period: clean_words(counter, period)
+            for period, counter in sorted(counters.items())
+        }
+
+    # variants sharing a layout are recolored instead of laid out again
+    with timer.stage("render"):
+        if config.group_by is not None:
+            render_periods(tables, render_specs(config), config.workers)
+        else:
+            render(tables.get("", Counter()), render_specs(config), config.workers)
+    timer.log("generate")
+
+
+def update_aggregates(
+    aggregates: DayAggregates,
+    input: Path,
+    segmenter: Segmenter,
+    token_filter: TokenFilter,
+    workers: int = 1,
+    cache: TokenCache | None = None,
+    chunk_size: int = 10000,
+) -> None:
+    # taken before reading, a change while reading shows on the next run
+    stat = input.stat()
+    source = f"{input.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    if aggregates.source() == source:
+        logger.info(f"{input} is unchanged, no new posts to count")
+        return
+    # a backfill or merge adds posts older than the ones counted, so the
+    # whole input is checked, only posts not counted yet are segmented
+    count = 0
+    with optional_pool(segmenter, workers, token_filter) as executor:
+        # every chunk is added in its own transaction, ids seen in an earlier
+        # chunk are already stored when the next one is checked
+        for chunk in chunks(read_posts(input), chunk_size):
+            if posts := aggregates.unseen(chunk):
+                days: dict[str, Counter[str]] = defaultdict(Counter)
+                count_chunk(
+                    days,
+                    posts,
+                    GroupBy.DAY,
+                    segmenter,
+                    token_filter,
+                    executor,
+                    workers,
+                    cache,
+                )
+                aggregates.add([post["id"] for post in posts], days)
+                count += len(posts)
+    aggregates.set_source(source)
+    logger.info(f"{count} new posts counted into {aggregates.path}")
 
 
-def split_use_thulac(thu: thulac.thulac, content: str) -> list[str]:
-    return [word[0] for word in thu.cut(content)]
+def split_word(
+    weibo_list: Iterable[dict[str, str]],
+    segmenter: Segmenter,
+    token_filter: TokenFilter,
+    workers: int = 1,
+    cache: TokenCache | None = None,
+) -> Counter[str]:
+    counters = count_periods(weibo_list, None, segmenter, token_filter, workers, cache)
+    return clean_words(counters.get("", Counter()))
+
+
+def count_periods(
+    weibo_list: Iterable[dict[str, str]],
+    group_by: GroupBy | None,
+    segmenter: Segmenter,
+    token_filter: TokenFilter,
+    workers: int = 1,
+    cache: TokenCache | None = None,
+    chunk_size: int = 10000,
+) -> dict[str, Counter[str]]:
+    """Word counts by period, chunk_size posts read and segmented at a time.
+
+    Tokens are filtered and counted as soon as a post is segmented and only
+    the counts are kept, so memory grows with the vocabulary rather than
+    with the corpus.
+    """
+    count, length = 0, 0
+    counters: dict[str, Counter[str]] = defaultdict(Counter)
+    with optional_pool(segmenter, workers, token_filter) as executor:
+        # weibo_list is already limited to the time range
+        for chunk in chunks(weibo_list, chunk_size):
+            count += len(chunk)
+            length += sum(len(weibo["content"]) for weibo in chunk)
+            count_chunk(
+                counters,
+                chunk,
+                group_by,
+                segmenter,
+                token_filter,
+                executor,
+                workers,
+                cache,
+            )
+    logger.debug(f"using {count} Weibo posts with {length} characters")
+    return counters
+
+
+def count_chunk(
+    counters: dict[str, Counter[str]],
+    chunk: list[dict[str, str]],
+    group_by: GroupBy | None,
+    segmenter: Segmenter,
+    token_filter: TokenFilter,
+    executor: ProcessPoolExecutor | None = None,
+    workers: int = 1,
+    cache: TokenCache | None = None,
+) -> None:
+    """Add the word counts of the posts in chunk to counters."""
+    periods = [
+        period_of(weibo["create_at"], group_by) if group_by is not None else ""
+        for weibo in chunk
+    ]
+    contents = [weibo["content"] for weibo in chunk]
+    if cache is not None:
+        word_lists = cut_cached(contents, segmenter, cache, executor, workers)
+        for period, word_list in zip(periods, word_lists):
+            counters[period].update(token_filter(word_list))
+    elif executor is not None and len(contents) > 1:
+        for period, counter in count_words_parallel(
+            list(zip(periods, contents)), executor, workers
+        ).items():
+            counters[period].update(counter)
+    else:
+        for period, word_list in zip(periods, segmenter.cut_many(contents)):
+            counters[period].update(token_filter(word_list))
 
 
-def split_use_pkuseg(pku: pkuseg.pkuseg, content: str) -> list[str]:
-    return pku.cut(content)  # type: ignore
+def clean_words(counter: Counter[str], period: str = "") -> Counter[str]:
+    # single character, stop and excluded words are dropped by the token filter
+    # remove subwords
+    for word in find_subwords(set(counter)):
+        del counter[word]
 
+    # remove word that only appears once
+    counter = Counter({word: n for word, n in counter.items() if n > 1})
 
-def split_use_hanlp(hantok: Component, content: str) -> list[str]:
-    return hantok(content)
+    logger.debug(f"{period + ': ' if period else ''}{counter.total()} words")
+    logger.debug(f"most common: {counter.most_common(30)}")
+    return counter
+
+
+def find_subwords(words: set[str]) -> set[str]:
+    """Words that are a character of, or one character shorter than, another."""
+    result: set[str] = set()
+    chars: set[str] = set()
+    for s in words:
+        if len(s) > 1:
+            chars.update(s)
+        # a substring one character shorter is either a prefix or a suffix
+        if len(s) > 0:
+            result.update(t for t in (s[:-1], s[1:]) if t in words)
+    result.update(t for t in words if len(t) == 1 and t in chars)
+    return result
 
 
-def split_word(
-    weibo_list: list[str],
-    before: datetime,
-    after: datetime,
-    split_use: SplitUse,
-    thu: thulac.thulac,
-    pku: pkuseg.pkuseg,
-    hantok: Component,
-) -> list[str]:
-    count, length = 0, 0
-    stopwords = get_stopwords()
-    result: list[str] = []
-
-    for weibo in weibo_list:
-        try:
-            content: dict[str, str] = json.loads(weibo)
-        except json.JSONDecodeError:
-            logger.error(f"cannot parse {weibo}")
-            continue
-
-        create_at = datetime.strptime(content["create_at"], "%Y-%m-%dT%H:%M:%S")
-        if create_at < after or create_at > before:
-            continue
-        count += 1
-        length += len(content["content"])
-        if split_use == SplitUse.PKUSEG:
-            word_list = split_use_pkuseg(pku, content["content"])
-        elif split_use == SplitUse.THULAC:
-            word_list = split_use_thulac(thu, content["content"])
-        elif split_use == SplitUse.HANLP:
-            word_list = split_use_hanlp(hantok, content["content"])
-        else:  # SplitUse.JIEBA
-            word_list = split_use_jieba(content["content"])
-
-        for word in word_list:
-            if (
-                word not in stopwords
-                and word != ""
-                and not all(letter in stopwords for letter in word)
-            ):
-                result.append(word)
-
-    # remove single character words
-    result = [word for word in result if len(word) > 1]
-
-    # remove some common words
-    exclude = {"网页链接", "网页", "链接", "jpg", ".jpg"}
-    result = [word for word in result if word not in exclude]
+# state of a segmentation worker process, set up once by its initializer
+worker_segmenter: Segmenter | None = None
+worker_filter: TokenFilter | None = None
 
-    # remove subwords
-    unique_result = set(result)
-    need_remove = set()
-    for s in unique_result:
-        for t in unique_result:
-            if t in s and len(s) > len(t) and (len(t) == 1 or len(s) - len(t) == 1):
-                need_remove.add(t)
 
-    result = [word for word in result if word not in need_remove]
+def init_segment_worker(
+    name: str,
+    custom_dict: Path | None,
+    batch_size: int,
+    batch_max_chars: int,
+    token_filter: TokenFilter | None = None,
+) -> None:
+    global worker_segmenter, worker_filter
+    worker_segmenter = get_segmenter(name, custom_dict, batch_size, batch_max_chars)
+    worker_filter = token_filter
+
+
+def cut_words(contents: list[str]) -> list[list[str]]:
+    assert worker_segmenter is not None
+    return worker_segmenter.cut_many(contents)
+
+
+def count_words(items: list[tuple[str, str]]) -> dict[str, Counter[str]]:
+    assert worker_segmenter is not None and worker_filter is not None
+    counters: dict[str, Counter[str]] = defaultdict(Counter)
+    periods = [period for period, _ in items]
+    contents = [content for _, content in items]
+    for period, word_list in zip(periods, worker_segmenter.cut_many(contents)):
+        counters[period].update(worker_filter(word_list))
+    return counters
+
+
+def count_words_parallel(
+    items: list[tuple[str, str]], executor: ProcessPoolExecutor, workers: int
+) -> dict[str, Counter[str]]:
+    """Word counts of (period, content) items by period, in worker processes."""
+    shards = split_shards(items, workers)
+    counters: dict[str, Counter[str]] = defaultdict(Counter)
+    for shard_counters in executor.map(count_words, shards):
+        for period, counter in shard_counters.items():
+            counters[period].update(counter)
+    logger.debug(f"segmented {len(items)} posts in {len(shards)} shards")
+    return counters
+
+
+def cut_parallel(
+    contents: list[str], executor: ProcessPoolExecutor, workers: int
+) -> list[list[str]]:
+    shards = split_shards(contents, workers)
+    result: list[list[str]] = []
+    for word_lists in executor.map(cut_words, shards):
+        result.extend(word_lists)
+    logger.debug(f"segmented {len(contents)} posts in {len(shards)} shards")
+    return result
 
-    # remove word that only appears once
-    counter = Counter(result)
-    need_remove = set(x for x, y in counter.items() if y == 1)
-    result = [word for word in result if word not in need_remove]
 
+def cut_cached(
+    contents: list[str],
+    segmenter: Segmenter,
+    cache: TokenCache,
+    executor: ProcessPoolExecutor | None = None,
+    workers: int = 1,
+) -> list[list[str]]:
+    """Tokens of every content, segmenting only the ones missing in cache."""
+    cached = cache.get_many(contents)
+    missing = list(dict.fromkeys(c for c in contents if c not in cached))
     logger.debug(
-        f"using {count} Weibo posts with {length} characters, {len(result)} words"
+        f"{len(contents) - len(missing)} posts from token cache, "
+        f"{len(missing)} to segment"
+    )
+    if missing:
+        if executor is not None and len(missing) > 1:
+            word_lists = cut_parallel(missing, executor, workers)
+        else:
+            word_lists = segmenter.cut_many(missing)
+        cache.put_many(zip(missing, word_lists))
+        cached.update(zip(missing, word_lists))
+    return [cached[content] for content in contents]
+
+
+def chunks(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def split_shards(items: list[T], workers: int) -> list[list[T]]:
+    # a few shards per worker so that a slow shard does not hold up the rest
+    size = max(1, -(-len(items) // (workers * 4)))
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def optional_pool(
+    segmenter: Segmenter, workers: int, token_filter: TokenFilter | None = None
+) -> ProcessPoolExecutor | nullcontext[None]:
+    # one pool for every chunk, its processes are started on the first task
+    if workers > 1:
+        return segment_pool(segmenter, workers, token_filter)
+    return nullcontext()
+
+
+def segment_pool(
+    segmenter: Segmenter, workers: int, token_filter: TokenFilter | None = None
+) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_segment_worker,
+        initargs=(
+            segmenter.name,
+            segmenter.custom_dict,
+            segmenter.batch_size,
+            segmenter.batch_max_chars,
+            token_filter,
+        ),
     )
-    counter = Counter(result)
-    logger.debug(f"most common: {counter.most_common(30)}")
-    return result
 
 
 def generate_wordcloud(
-    word_list: list[str],
+    frequencies: Counter[str],
     output: Path,
     max_word: int,
     font_path: Path | None = None,
     mask: NDArray[np.uint8] | None = None,
 ) -> None:
-    # color_func = wordcloud.get_single_color_func("#D90E2C")
-    cloud = wordcloud.WordCloud(
-        font_path=str(font_path) if font_path is not None else None,
-        mask=mask,
-        background_color="white",
-        prefer_horizontal=1,
-        max_words=max_word,
-        scale=2,
-        # color_func=color_func,
-        colormap="ocean",
-    )
-    cloud.generate(" ".join(word_list))
+    cloud = create_cloud(max_word, font_path, mask)
+    # the words are final, wordcloud must not split or count them again
+    cloud.generate_from_frequencies(frequencies)
     cloud.to_file(output)
@@ -0,0 +1,201 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TextIO
+
+from wwg.client import RequestStat
+
+logger = logging.getLogger(__name__)
+
+latency_buckets = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def progress(timelines: list[tuple[datetime, datetime, datetime]]) -> float | None:
+    """Share of the time spans down to `after` already crawled, on average."""
+    fractions = [
+        (newest - oldest) / (newest - after)
+        for newest, oldest, after in timelines
+        if newest > after
+    ]
+    return sum(fractions) / len(fractions) if fractions else None
+
+
+class CrawlMetrics:
+    """Counters of one crawl run, shared by every thread of the run.
+
+    Requests are reported by CrawlClient listeners, pages, posts and parse
+    times by the crawl loop. Events are appended to the JSONL file as they
+    happen, totals are kept for the summary and the Prometheus textfile.
+    """
+
+    def __init__(
+        self, progress_interval: float = 60.0, events: Path | None = None
+    ) -> None:
+        self.progress_interval = progress_interval
+        self.start = time.perf_counter()
+        self.events = events
+        # line buffered, a crash loses at most the event being written
+        self._events: TextIO | None = (
+            open(events, "w", encoding="utf-8", buffering=1)
+            if events is not None
+            else None
+        )
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.status: Counter[str] = Counter()
+        self.latency = 0.0
+        self.latency_buckets = [0] * len(latency_buckets)
+        self.sleep = 0.0
+        self.pages = 0
+        self.posts = 0
+        self.parses = 0
+        self.parse_time = 0.0
+        # newest and oldest create time seen per uid, with the uid's `after`
+        self.timelines: dict[str, tuple[datetime, datetime, datetime]] = {}
+        self._last_progress = self.start
+        self._lock = threading.Lock()
+
+    def _event(self, event: str, **values: object) -> None:
+        if self._events is not None:
+            self._events.write(
+                json.dumps(
+                    {
+                        "event": event,
+                        "time": time.perf_counter() - self.start,
+                        **values,
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+    def observe_request(self, stat: RequestStat) -> None:
+        with self._lock:
+            self.requests += 1
+            self.retries += 1 if stat.attempt > 0 else 0
+            self.bytes += stat.size
+            self.status[str(stat.status) if stat.status is not None else "error"] += 1
+            self.latency += stat.elapsed
+            for i, bound in enumerate(latency_buckets):
+                if stat.elapsed <= bound:
+                    self.latency_buckets[i] += 1
+            self.sleep += stat.waited + stat.backoff
+            self._event("request", **asdict(stat))
+
+    def observe_parse(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self.parses += 1
+            self.parse_time += seconds
+            self._event("parse", kind=kind, seconds=seconds)
+
+    def observe_page(self, uid: str, url: str, posts: int) -> None:
+        with self._lock:
+            self.pages += 1
+            self._event("page", uid=uid, url=url, posts=posts)
+
+    def observe_post(self, uid: str, create_at: datetime, after: datetime) -> None:
+        with self._lock:
+            self.posts += 1
+            newest, _, _ = self.timelines.get(uid, (create_at, create_at, after))
+            self.timelines[uid] = (newest, create_at, after)
+            now = time.perf_counter()
+            if now - self._last_progress < self.progress_interval:
+                return
+            self._last_progress = now
+            # other account threads add uids meanwhile, log from a snapshot
+            posts, timelines = self.posts, list(self.timelines.values())
+        self.log_progress(posts, timelines)
+
+    def log_progress(
+        self, posts: int, timelines: list[tuple[datetime, datetime, datetime]]
+    ) -> None:
+        elapsed = time.perf_counter() - self.start
+        message = f"{posts} posts, {posts / elapsed * 60:.1f} posts/min"
+        if (share := progress(timelines)) is not None and share > 0:
+            eta = timedelta(seconds=round(elapsed * (1 - share) / share))
+            message += f", {share:.1%} of the time span, ETA {eta}"
+        logger.info(message)
+
+    def summary(self) -> dict[str, object]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "elapsed": elapsed,
+            "requests": self.requests,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "status": dict(self.status),
+            "latency_mean": self.latency / self.requests if self.requests else 0.0,
+            "sleep": self.sleep,
+            "pages": self.pages,
+            "posts": self.posts,
+            "posts_per_page": self.posts / self.pages if self.pages else 0.0,
+            "posts_per_minute": self.posts / elapsed * 60 if elapsed > 0 else 0.0,
+            "parse_time": self.parse_time,
+        }
+
+    def close(self) -> None:
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    def export(self, prometheus: Path | None) -> None:
+        """Append the summary to the events and write the Prometheus textfile."""
+        if self._events is not None:
+            with self._lock:
+                self._events.write(
+                    json.dumps({"event": "summary", **self.summary()}) + "\n"
+                )
+            self.close()
+            logger.info(f"crawl metrics written to {self.events}")
+        if prometheus is not None:
+            # node_exporter may read the textfile at any time, replace it at once
+            tmp = prometheus.with_name(f"{prometheus.name}.tmp")
+            tmp.write_text(self.prometheus(), encoding="utf-8")
+            tmp.replace(prometheus)
+            logger.info(f"crawl metrics written to {prometheus}")
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP wwg_crawl_requests_total Requests sent by status code.",
+            "# TYPE wwg_crawl_requests_total counter",
+        ]
+        for status, count in sorted(self.status.items()):
+            lines.append(f'wwg_crawl_requests_total{{status="{status}"}} {count}')
+        lines += [
+            "# HELP wwg_crawl_request_seconds Request latency.",
+            "# TYPE wwg_crawl_request_seconds histogram",
+        ]
+        for bound, count in zip(latency_buckets, self.latency_buckets):
+            lines.append(f'wwg_crawl_request_seconds_bucket{{le="{bound}"}} {count}')
+        lines += [
+            f'wwg_crawl_request_seconds_bucket{{le="+Inf"}} {self.requests}',
+            f"wwg_crawl_request_seconds_sum {self.latency}",
+            f"wwg_crawl_request_seconds_count {self.requests}",
+        ]
+        for name, kind, value, help in [
+            ("retries_total", "counter", self.retries, "Retried requests."),
+            ("response_bytes_total", "counter", self.bytes, "Bytes received."),
+            ("sleep_seconds_total", "counter", self.sleep, "Time spent waiting."),
+            ("pages_total", "counter", self.pages, "Listing pages crawled."),
+            ("posts_total", "counter", self.posts, "Posts written."),
+            ("parse_seconds_total", "counter", self.parse_time, "Time parsing."),
+            ("parses_total", "counter", self.parses, "Pages parsed."),
+            (
+                "duration_seconds",
+                "gauge",
+                time.perf_counter() - self.start,
+                "Duration of the crawl.",
+            ),
+        ]:
+            lines += [
+                f"# HELP wwg_crawl_{name} {help}",
+                f"# TYPE wwg_crawl_{name} {kind}",
+                f"wwg_crawl_{name} {value}",
+            ]
+        return "\n".join(lines) + "\n"
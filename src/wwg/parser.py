@@ -0,0 +1,303 @@
+import json
+import logging
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Iterator
+
+import lxml.html
+from bs4 import BeautifulSoup, Tag
+from lxml import etree
+
+from wwg.config import ParserBackend
+
+logger = logging.getLogger(__name__)
+time_pattern = r"(?:(?:今天)|(?:(?P<month>\d\d)月(?P<day>\d\d)日)|(?:(?P<yyyy>\d\d\d\d)-(?P<MM>\d\d)-(?P<dd>\d\d)))\s(?P<HH>\d\d):(?P<mm>\d\d)(?::(?P<ss>\d\d))?.*"  # noqa
+xml_declaration = '<?xml version="1.0" encoding="UTF-8"?>'
+
+
+@dataclass
+class Weibo:
+    id: str
+    content: str
+    create_at: datetime
+
+    def to_dict(self) -> dict[str, str]:
+        d = asdict(self)
+        d["create_at"] = self.create_at.strftime("%Y-%m-%dT%H:%M:%S")
+        return d
+
+    def __str__(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+@dataclass
+class ParsedPost:
+    id: str
+    repost: bool
+    # href of the full text page, the post itself is not parsed if it is set
+    full_text: str | None
+    weibo: Weibo | None
+
+
+@dataclass
+class ParsedPage:
+    posts: list[ParsedPost]
+    next_page: str | None
+
+
+class PageParser:
+    # now is the time the page was fetched, relative create times such as
+    # "今天 12:34" are resolved against it
+    def parse_page(self, html: str, now: datetime | None = None) -> ParsedPage:
+        raise NotImplementedError
+
+    def parse_full_text(
+        self, weibo_id: str, html: str, now: datetime | None = None
+    ) -> Weibo | None:
+        raise NotImplementedError
+
+
+def get_parser(backend: ParserBackend) -> PageParser:
+    if backend == ParserBackend.HTML5LIB:
+        return Html5libParser()
+    return LxmlParser()
+
+
+def weibo_predictor(tag: Tag) -> bool:
+    return (
+        tag.name == "div"
+        and tag.has_attr("class")
+        and "c" in tag.attrs["class"]
+        and tag.has_attr("id")
+        and tag.attrs["id"].startswith("M_")
+    )
+
+
+def repost_predictor(tag: Tag) -> bool:
+    return (
+        tag.has_attr("class")
+        and "cmt" in tag.attrs["class"]
+        and tag.text.startswith("转发理由")
+    )
+
+
+def content_predictor(tag: Tag) -> bool:
+    return tag.name == "span" and tag.has_attr("class") and "ctt" in tag.attrs["class"]
+
+
+def create_time_predictor(tag: Tag) -> bool:
+    return tag.name == "span" and tag.has_attr("class") and "ct" in tag.attrs["class"]
+
+
+def full_text_predictor(tag: Tag) -> bool:
+    return tag.name == "a" and tag.has_attr("href") and tag.text.strip() == "全文"
+
+
+def next_page_predictor(tag: Tag) -> bool:
+    return tag.name == "a" and tag.has_attr("href") and tag.text.strip() == "下页"
+
+
+class Html5libParser(PageParser):
+    """BeautifulSoup with the html5lib tree builder, slow but most lenient."""
+
+    def parse_page(self, html: str, now: datetime | None = None) -> ParsedPage:
+        soup = BeautifulSoup(html.removeprefix(xml_declaration), "html5lib")
+        posts: list[ParsedPost] = []
+        weibo: Tag
+        for weibo in soup.find_all(weibo_predictor):
+            weibo_id = weibo.attrs["id"].removeprefix("M_")
+            repost = len(weibo.find_all(repost_predictor)) > 0
+            if (
+                full_text := weibo.find(full_text_predictor)
+            ) is not None and isinstance(full_text, Tag):
+                posts.append(
+                    ParsedPost(weibo_id, repost, full_text.attrs["href"], None)
+                )
+            else:
+                posts.append(
+                    ParsedPost(
+                        weibo_id, repost, None, parse_weibo(weibo_id, weibo, now)
+                    )
+                )
+        next_page = soup.find(next_page_predictor)
+        return ParsedPage(
+            posts,
+            next_page.attrs["href"] if isinstance(next_page, Tag) else None,
+        )
+
+    def parse_full_text(
+        self, weibo_id: str, html: str, now: datetime | None = None
+    ) -> Weibo | None:
+        soup = BeautifulSoup(html.removeprefix(xml_declaration), "html5lib")
+        if (weibo := soup.find(weibo_predictor)) is not None and isinstance(weibo, Tag):
+            return parse_weibo(weibo_id, weibo, now)
+        return None
+
+
+def parse_weibo(weibo_id: str, weibo: Tag, now: datetime | None = None) -> Weibo | None:
+    if (content := weibo.find(content_predictor)) is not None and (
+        create_time := weibo.find(create_time_predictor)
+    ) is not None:
+        return Weibo(
+            weibo_id,
+            content.get_text(separator="\n", strip=True).removeprefix(":"),
+            parse_time(create_time.text.strip(), now),
+        )
+    else:
+        logger.error(f"parse weibo {weibo_id} failed: {weibo}")
+        return None
+
+
+def has_class(name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+class LxmlParser(PageParser):
+    """libxml2 HTML parser with compiled XPath selectors.
+
+    Produces the same result as Html5libParser on weibo.cn pages, every post
+    is visited once through a single XPath query for the nodes it needs.
+    """
+
+    weibo_xpath = etree.XPath(f'//div[starts-with(@id, "M_") and {has_class("c")}]')
+    # nodes of interest inside a post, returned in document order
+    post_xpath = etree.XPath(
+        f'.//span[{has_class("ctt")} or {has_class("ct")}]'
+        f' | .//a[@href][contains(., "全文")]'
+        f' | .//*[{has_class("cmt")}][starts-with(., "转发理由")]'
+    )
+    next_page_xpath = etree.XPath('//a[@href][contains(., "下页")]')
+
+    def parse_page(self, html: str, now: datetime | None = None) -> ParsedPage:
+        root = document(html)
+        posts: list[ParsedPost] = []
+        for weibo in self.weibo_xpath(root):
+            weibo_id = weibo.get("id").removeprefix("M_")
+            content, create_time, full_text, repost = self._select(weibo)
+            if full_text is not None:
+                posts.append(ParsedPost(weibo_id, repost, full_text, None))
+            else:
+                posts.append(
+                    ParsedPost(
+                        weibo_id,
+                        repost,
+                        None,
+                        self._parse_weibo(weibo_id, weibo, content, create_time, now),
+                    )
+                )
+        next_page = None
+        for a in self.next_page_xpath(root):
+            if text_content(a).strip() == "下页":
+                next_page = a.get("href")
+                break
+        return ParsedPage(posts, next_page)
+
+    def parse_full_text(
+        self, weibo_id: str, html: str, now: datetime | None = None
+    ) -> Weibo | None:
+        root = document(html)
+        for weibo in self.weibo_xpath(root):
+            content, create_time, _, _ = self._select(weibo)
+            return self._parse_weibo(weibo_id, weibo, content, create_time, now)
+        return None
+
+    def _select(
+        self, weibo: etree._Element
+    ) -> tuple[etree._Element | None, etree._Element | None, str | None, bool]:
+        content, create_time, full_text, repost = None, None, None, False
+        for node in self.post_xpath(weibo):
+            if node.tag == "span":
+                classes = node.get("class", "").split()
+                if content is None and "ctt" in classes:
+                    content = node
+                if create_time is None and "ct" in classes:
+                    create_time = node
+            if (
+                full_text is None
+                and node.tag == "a"
+                and text_content(node).strip() == "全文"
+            ):
+                full_text = node.get("href")
+            if "cmt" in node.get("class", "").split() and text_content(node).startswith(
+                "转发理由"
+            ):
+                repost = True
+        return content, create_time, full_text, repost
+
+    def _parse_weibo(
+        self,
+        weibo_id: str,
+        weibo: etree._Element,
+        content: etree._Element | None,
+        create_time: etree._Element | None,
+        now: datetime | None = None,
+    ) -> Weibo | None:
+        if content is not None and create_time is not None:
+            return Weibo(
+                weibo_id,
+                "\n".join(
+                    s for s in (s.strip() for s in strings(content)) if s != ""
+                ).removeprefix(":"),
+                parse_time(text_content(create_time).strip(), now),
+            )
+        else:
+            logger.error(
+                f"parse weibo {weibo_id} failed: "
+                f"{etree.tostring(weibo, encoding='unicode', with_tail=False)}"
+            )
+            return None
+
+
+def document(html: str) -> etree._Element:
+    html = html.removeprefix(xml_declaration)
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an encoding declaration is refused by lxml
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        # empty document, html5lib would give an empty tree as well
+        return lxml.html.document_fromstring("<html></html>")
+
+
+def strings(element: etree._Element) -> Iterator[str]:
+    # text nodes in document order, skipping comments like BeautifulSoup does
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str):
+            yield from strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def text_content(element: etree._Element) -> str:
+    return "".join(strings(element))
+
+
+def parse_time(s: str, now: datetime | None = None) -> datetime:
+    if now is None:
+        now = datetime.now()
+    if (match := re.match(time_pattern, s)) is not None:
+        return datetime(
+            int(y) if (y := match.group("yyyy")) is not None else now.year,
+            (
+                int(m)
+                if (m := match.group("MM")) is not None
+                or (m := match.group("month")) is not None
+                else now.month
+            ),
+            (
+                int(d)
+                if (d := match.group("dd")) is not None
+                or (d := match.group("day")) is not None
+                else now.day
+            ),
+            int(match.group("HH")),
+            int(match.group("mm")),
+            int(s) if (s := match.group("ss")) is not None else 0,
+        )
+
+    logger.warning(f"cannot parse create time: {s}, return {now} instead.")
+    return now
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every request of a crawl.
+
+    ``interval`` is the average number of seconds between two requests and
+    ``burst`` the number of requests that may be sent back to back after the
+    bucket has been idle.
+    """
+
+    def __init__(self, interval: float, burst: int = 1) -> None:
+        self.interval = max(0.0, interval)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.interval == 0:
+            self._tokens = float(self.burst)
+        else:
+            elapsed = now - self._updated
+            self._tokens = min(
+                float(self.burst), self._tokens + elapsed / self.interval
+            )
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available.
+
+        Returns the number of seconds spent waiting.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            # reserve the token now, callers queue up behind each other
+            self._tokens -= 1
+            wait = -self._tokens * self.interval if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """Token bucket whose interval follows an AIMD controller.
+
+    Every fast 200 response adds ``increase`` requests per second to the
+    rate, a throttling response (403/418/429), a server error or a failed
+    connection cuts the rate by ``decrease``, and a latency well above the
+    recent average cuts it slightly. The interval always stays within
+    ``[min_interval, max_interval]``.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        burst: int = 1,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+        increase: float = 0.01,
+        decrease: float = 0.5,
+    ) -> None:
+        self.min_interval = max(0.01, min(min_interval, max_interval))
+        self.max_interval = max(self.min_interval, max_interval)
+        super().__init__(self._clamp(interval), burst)
+        self.increase = increase
+        self.decrease = decrease
+        self._latency: float | None = None
+        self._samples = 0
+        self._logged = self.interval
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def observe(self, status: int | None, elapsed: float) -> None:
+        with self._lock:
+            rate = 1 / self.interval
+            if status is None or status in {403, 418, 429} or status >= 500:
+                rate *= self.decrease
+            elif status == 200:
+                if (
+                    self._latency is not None
+                    and self._samples >= 5
+                    and elapsed > 2 * self._latency
+                ):
+                    # the server slows down before it starts refusing
+                    rate *= 0.8
+                else:
+                    rate += self.increase
+                self._latency = (
+                    elapsed
+                    if self._latency is None
+                    else 0.8 * self._latency + 0.2 * elapsed
+                )
+                self._samples += 1
+            self._refill(time.monotonic())
+            self.interval = self._clamp(1 / rate)
+            interval = self.interval
+            changed = not (0.8 < interval / self._logged < 1.25)
+            if changed:
+                self._logged = interval
+        if changed:
+            logger.info(
+                f"request pace {60 / interval:.1f}/min (interval {interval:.2f}s)"
+            )
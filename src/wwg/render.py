@@ -0,0 +1,164 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import groupby
+from pathlib import Path
+from typing import Mapping
+
+import numpy as np
+import wordcloud
+from numpy.typing import NDArray
+from PIL import Image
+
+from wwg.config import GenerateConfig, RenderVariant
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    """A render variant with every option resolved."""
+
+    output: Path
+    font: Path | None
+    mask: Path | None
+    colormap: str
+    max_word: int
+    scale: float
+
+    @property
+    def layout(self) -> tuple[Path | None, Path | None, int, float]:
+        # variants sharing these place the words the same way
+        return self.font, self.mask, self.max_word, self.scale
+
+
+def render_specs(config: GenerateConfig) -> list[RenderSpec]:
+    # output itself is always rendered, variants are additional images
+    variants = [RenderVariant(config.output), *config.variants]
+    return [
+        RenderSpec(
+            variant.output,
+            variant.font if variant.font is not None else config.font,
+            variant.mask if variant.mask is not None else config.mask,
+            variant.colormap if variant.colormap is not None else config.colormap,
+            variant.max_word if variant.max_word is not None else config.max_word,
+            variant.scale if variant.scale is not None else config.scale,
+        )
+        for variant in variants
+    ]
+
+
+@lru_cache(maxsize=None)
+def load_mask(path: Path) -> NDArray[np.uint8]:
+    logger.debug(f"load mask from {path}")
+    return np.array(Image.open(str(path)).convert("RGB"))
+
+
+def create_cloud(
+    max_word: int,
+    font_path: Path | None = None,
+    mask: NDArray[np.uint8] | None = None,
+    colormap: str = "ocean",
+    scale: float = 2,
+) -> wordcloud.WordCloud:
+    # color_func = wordcloud.get_single_color_func("#D90E2C")
+    return wordcloud.WordCloud(
+        font_path=str(font_path) if font_path is not None else None,
+        mask=mask,
+        background_color="white",
+        prefer_horizontal=1,
+        max_words=max_word,
+        scale=scale,
+        # color_func=color_func,
+        colormap=colormap,
+    )
+
+
+def render_layout(frequencies: Mapping[str, int], specs: list[RenderSpec]) -> None:
+    """Lay the words out once and write one image per colormap."""
+    first = specs[0]
+    mask = (
+        load_mask(first.mask)
+        if first.mask is not None and first.mask.exists()
+        else None
+    )
+    cloud = create_cloud(first.max_word, first.font, mask, first.colormap, first.scale)
+    cloud.generate_from_frequencies(frequencies)
+    colormap = first.colormap
+    for spec in specs:
+        if spec.colormap != colormap:
+            cloud.recolor(colormap=spec.colormap)
+            colormap = spec.colormap
+        cloud.to_file(spec.output)
+        logger.info(f"wordcloud written to {spec.output}")
+
+
+def period_spec(spec: RenderSpec, period: str) -> RenderSpec:
+    # weibo.png of 2024-05 is written to weibo.2024-05.png
+    output = spec.output.with_name(f"{spec.output.stem}.{period}{spec.output.suffix}")
+    return replace(spec, output=output)
+
+
+def layout_groups(specs: list[RenderSpec]) -> list[list[RenderSpec]]:
+    return [
+        list(group)
+        for _, group in groupby(
+            sorted(specs, key=lambda s: str(s.layout)), key=lambda s: s.layout
+        )
+    ]
+
+
+# frequency tables of a render worker process, sent once by its initializer
+worker_tables: Mapping[str, Mapping[str, int]] = {}
+
+
+def init_render_worker(tables: Mapping[str, Mapping[str, int]]) -> None:
+    global worker_tables
+    worker_tables = tables
+
+
+def render_worker(key: str, specs: list[RenderSpec]) -> None:
+    render_layout(worker_tables[key], specs)
+
+
+def render(
+    frequencies: Mapping[str, int], specs: list[RenderSpec], workers: int = 1
+) -> None:
+    render_tables({"": frequencies}, {"": specs}, workers)
+
+
+def render_periods(
+    tables: Mapping[str, Mapping[str, int]], specs: list[RenderSpec], workers: int = 1
+) -> None:
+    """Render every variant once per period, named after the period."""
+    period_specs: dict[str, list[RenderSpec]] = {}
+    for period, frequencies in tables.items():
+        if len(frequencies) == 0:
+            logger.warning(f"no words left in {period}, skip its wordcloud")
+            continue
+        period_specs[period] = [period_spec(spec, period) for spec in specs]
+    render_tables(tables, period_specs, workers)
+
+
+def render_tables(
+    tables: Mapping[str, Mapping[str, int]],
+    specs: Mapping[str, list[RenderSpec]],
+    workers: int = 1,
+) -> None:
+    tasks = [(key, group) for key in specs for group in layout_groups(specs[key])]
+    logger.debug(
+        f"render {sum(len(s) for s in specs.values())} images "
+        f"with {len(tasks)} layouts"
+    )
+    if workers <= 1 or len(tasks) <= 1:
+        for key, group in tasks:
+            render_layout(tables[key], group)
+        return
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        initializer=init_render_worker,
+        initargs=(tables,),
+    ) as executor:
+        # consume the results so that a failed variant raises here
+        list(executor.map(render_worker, *zip(*tasks)))
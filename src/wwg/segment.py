@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Segmenter:
+    """Word segmentation backend.
+
+    The backend module is imported and its model loaded on the first cut, so
+    registering a segmenter costs nothing until it is used. Backends running
+    a neural model override cut_many to process posts in batches of at most
+    batch_size posts and batch_max_chars characters (0 for no limit).
+    """
+
+    name = ""
+
+    def __init__(
+        self,
+        custom_dict: Path | None = None,
+        batch_size: int = 32,
+        batch_max_chars: int = 0,
+    ) -> None:
+        self.custom_dict = custom_dict
+        self.batch_size = batch_size
+        self.batch_max_chars = batch_max_chars
+        self._backend: Any = None
+        # seconds spent loading the backend, reported as a stage of its own
+        self.load_seconds = 0.0
+
+    @property
+    def backend(self) -> Any:
+        if self._backend is None:
+            logger.debug(f"load segmenter {self.name}")
+            start = time.perf_counter()
+            self._backend = self.load()
+            self.load_seconds = time.perf_counter() - start
+        return self._backend
+
+    def fingerprint(self) -> str:
+        """Identifies the tokens this segmenter produces."""
+        dict_hash = (
+            hashlib.sha256(self.custom_dict.read_bytes()).hexdigest()
+            if self.custom_dict is not None
+            else ""
+        )
+        return f"{self.name}\0{dict_hash}"
+
+    def load(self) -> Any:
+        raise NotImplementedError
+
+    def cut(self, content: str) -> list[str]:
+        raise NotImplementedError
+
+    def cut_many(self, contents: list[str]) -> list[list[str]]:
+        return [self.cut(content) for content in contents]
+
+    def batches(self, contents: list[str]) -> list[list[int]]:
+        """Indices of contents grouped into batches of similar length."""
+        # sorting by length keeps the padding within a batch small
+        order = sorted(range(len(contents)), key=lambda i: len(contents[i]))
+        result: list[list[int]] = []
+        batch: list[int] = []
+        chars = 0
+        for i in order:
+            if batch and (
+                len(batch) >= self.batch_size
+                or 0 < self.batch_max_chars < chars + len(contents[i])
+            ):
+                result.append(batch)
+                batch, chars = [], 0
+            batch.append(i)
+            chars += len(contents[i])
+        if batch:
+            result.append(batch)
+        return result
+
+
+segmenters: dict[str, type[Segmenter]] = {}
+
+
+def register(name: str) -> Callable[[type[Segmenter]], type[Segmenter]]:
+    def wrapper(cls: type[Segmenter]) -> type[Segmenter]:
+        cls.name = name
+        segmenters[name] = cls
+        return cls
+
+    return wrapper
+
+
+def get_segmenter(
+    name: str,
+    custom_dict: Path | None = None,
+    batch_size: int = 32,
+    batch_max_chars: int = 0,
+) -> Segmenter:
+    if name not in segmenters:
+        raise ValueError(
+            f"unknown segmenter {name}, choose from {', '.join(segmenters)}"
+        )
+    return segmenters[name](custom_dict, max(1, batch_size), max(0, batch_max_chars))
+
+
+@register("jieba")
+class JiebaSegmenter(Segmenter):
+    def load(self) -> Any:
+        import jieba
+
+        jieba.setLogLevel(logging.ERROR)
+        if self.custom_dict is not None:
+            logger.debug(f"load custom_dict from {self.custom_dict}")
+            jieba.load_userdict(str(self.custom_dict))
+        # the dictionary is loaded here rather than on the first cut
+        jieba.initialize()
+        return jieba
+
+    def cut(self, content: str) -> list[str]:
+        return self.backend.lcut(content, cut_all=True, HMM=True)
+
+
+@register("thulac")
+class ThulacSegmenter(Segmenter):
+    def load(self) -> Any:
+        import thulac
+
+        return thulac.thulac(
+            user_dict=str(self.custom_dict) if self.custom_dict is not None else None,
+            seg_only=True,
+            filt=True,
+            rm_space=True,
+            T2S=True,
+        )
+
+    def cut(self, content: str) -> list[str]:
+        return [word[0] for word in self.backend.cut(content)]
+
+
+@register("pkuseg")
+class PkusegSegmenter(Segmenter):
+    def load(self) -> Any:
+        import pkuseg
+
+        if self.custom_dict is not None:
+            return pkuseg.pkuseg(model_name="web", user_dict=str(self.custom_dict))
+        return pkuseg.pkuseg(model_name="web")
+
+    def cut(self, content: str) -> list[str]:
+        return self.backend.cut(content)
+
+
+@register("hanlp")
+class HanlpSegmenter(Segmenter):
+    def load(self) -> Any:
+        import hanlp
+        import hanlp.pretrained
+
+        hantok = hanlp.load(hanlp.pretrained.tok.COARSE_ELECTRA_SMALL_ZH)
+        hantok.dict_force = None
+        hantok.dict_combine = None
+        if self.custom_dict is not None:
+            hantok.dict_force = set(
+                self.custom_dict.read_text(encoding="utf-8").split("\n")
+            )
+        return hantok
+
+    def cut(self, content: str) -> list[str]:
+        return self.backend(content)
+
+    def cut_many(self, contents: list[str]) -> list[list[str]]:
+        # one forward pass per batch instead of one per post
+        result: list[list[str]] = [[] for _ in contents]
+        for batch in self.batches(contents):
+            words = self.backend([contents[i] for i in batch], batch_size=len(batch))
+            for i, word_list in zip(batch, words):
+                result[i] = word_list
+        return result
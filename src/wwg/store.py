@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+store_suffixes = {".sqlite", ".sqlite3", ".db"}
+
+
+def is_store(path: Path) -> bool:
+    return path.suffix in store_suffixes
+
+
+class CorpusStore:
+    """Posts in a sqlite table indexed on id and create_at.
+
+    Rows have the fields of a weibo.jsonl line, create_at in the same fixed
+    format so that it sorts as text. Writing a post again replaces it, a
+    time range is read through the create_at index.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # accounts and partitions of a crawl write from their own threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            "id TEXT PRIMARY KEY, "
+            "uid TEXT, "
+            "content TEXT NOT NULL, "
+            "create_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS posts_create_at ON posts (create_at)"
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "CorpusStore":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def upsert(self, posts: Iterable[dict[str, Any]], uid: str | None = None) -> int:
+        with self._lock:
+            # keep the uid of a post stored before when it is not known now
+            cursor = self._conn.executemany(
+                "INSERT INTO posts VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE "
+                "SET uid = coalesce(excluded.uid, uid), "
+                "content = excluded.content, create_at = excluded.create_at",
+                ((p["id"], uid, p["content"], p["create_at"]) for p in posts),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def posts(
+        self,
+        after: datetime | None = None,
+        before: datetime | None = None,
+        uid: str | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Posts created within [after, before], newest first like the JSONL."""
+        sql = "SELECT id, content, create_at FROM posts WHERE 1"
+        params: list[str] = []
+        # isoformat keeps the microseconds of a bound, see wwg.corpus
+        if after is not None:
+            sql += " AND create_at >= ?"
+            params.append(after.isoformat())
+        if before is not None:
+            sql += " AND create_at <= ?"
+            params.append(before.isoformat())
+        if uid is not None:
+            sql += " AND uid = ?"
+            params.append(uid)
+        sql += " ORDER BY create_at DESC, id DESC"
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+        while True:
+            # the lock is not held while the caller consumes a batch
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for post_id, content, create_at in rows:
+                yield {"id": post_id, "content": content, "create_at": create_at}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM posts").fetchone()[0]
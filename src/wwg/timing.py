@@ -0,0 +1,138 @@
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Generic, Iterable, Iterator, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def peak_memory(children: bool = False) -> int | None:
+    """Peak resident set size in bytes, None where it cannot be read.
+
+    With children, the largest peak of the finished worker processes.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None if children else windows_peak_memory()
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+    # kilobytes on linux, bytes on macos
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def windows_peak_memory() -> int | None:
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(  # type: ignore[attr-defined]
+        ctypes.windll.kernel32.GetCurrentProcess(),  # type: ignore[attr-defined]
+        ctypes.byref(counters),
+        counters.cb,
+    ):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def megabytes(size: int | None) -> str:
+    return f"{size / 2**20:.1f}" if size is not None else "-"
+
+
+class StageTimer:
+    """Wall time and peak memory of the stages of a command, in order.
+
+    A stage entered again adds to its time. The peak is the resident set
+    size of the process when the stage ends, it never decreases.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.seconds: dict[str, float] = {}
+        self.peaks: dict[str, int | None] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = (
+                self.seconds.get(name, 0.0) + time.perf_counter() - start
+            )
+            self.peaks[name] = peak_memory()
+
+    def split(self, stage: str, name: str, seconds: float) -> None:
+        """Move seconds spent within stage into a stage of their own."""
+        if seconds <= 0 or stage not in self.seconds:
+            return
+        seconds = min(seconds, self.seconds[stage])
+        if name not in self.seconds:
+            # listed right before the stage it was part of
+            ordered: dict[str, float] = {}
+            for key, value in self.seconds.items():
+                if key == stage:
+                    ordered[name] = 0.0
+                ordered[key] = value
+            self.seconds = ordered
+            self.peaks[name] = self.peaks[stage]
+        self.seconds[stage] -= seconds
+        self.seconds[name] += seconds
+
+    def log(self, title: str) -> None:
+        total = time.perf_counter() - self.start
+        logger.info(f"{title} stages:")
+        logger.info(f"{'stage':<20}{'seconds':>10}{'share':>8}{'peak MB':>10}")
+        for name, seconds in self.seconds.items():
+            logger.info(
+                f"{name:<20}{seconds:>10.2f}{seconds / total if total else 0:>8.1%}"
+                f"{megabytes(self.peaks[name]):>10}"
+            )
+        logger.info(
+            f"{'total':<20}{total:>10.2f}{1:>8.1%}{megabytes(peak_memory()):>10}"
+        )
+        if (children := peak_memory(children=True)) is not None and children > 0:
+            logger.info(f"peak MB of worker processes: {megabytes(children)}")
+
+
+class Timed(Generic[T]):
+    """Iterator over items, summing the seconds spent producing them.
+
+    Used for a lazy input consumed within a stage, whose time is then split
+    off that stage.
+    """
+
+    def __init__(self, items: Iterable[T]) -> None:
+        self.items = iter(items)
+        self.seconds = 0.0
+
+    def __iter__(self) -> "Timed[T]":
+        return self
+
+    def __next__(self) -> T:
+        start = time.perf_counter()
+        try:
+            return next(self.items)
+        finally:
+            self.seconds += time.perf_counter() - start
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+from wwg.parser import Weibo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Checkpoint:
+    url: str
+    page: int
+    last_id: str | None = None
+    # size of the output file when the checkpoint was recorded, everything
+    # behind it belongs to pages that were not committed
+    offset: int | None = None
+    append: bool = True
+    # start url of the crawl, which covers the uid and the start page, so
+    # that another crawl with the same output does not resume this one
+    start: str | None = None
+
+
+def checkpoint_path(output: Path) -> Path:
+    return output.with_name(f"{output.name}.checkpoint")
+
+
+def load_checkpoint(path: Path) -> Checkpoint | None:
+    if not path.exists():
+        return None
+    try:
+        return Checkpoint(**json.loads(path.read_text(encoding="utf-8")))
+    except (json.JSONDecodeError, TypeError):
+        logger.warning(f"ignore broken checkpoint {path}")
+        return None
+
+
+def save_checkpoint(path: Path, checkpoint: Checkpoint) -> None:
+    # write then rename so that an interrupted save never leaves a broken file
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(asdict(checkpoint)), encoding="utf-8")
+    tmp.replace(path)
+
+
+def write_jsonl(path: Path, lines: Iterable[str]) -> None:
+    """Replace path with lines at once, the old file survives a crash."""
+    tmp = path.with_name(f"{path.name}.partial")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(f"{line}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+class PageWriter:
+    """JSONL output committed one page at a time.
+
+    Records of a page are buffered and written together on commit. The file
+    is fsynced at most every ``fsync_interval`` seconds, and only then the
+    checkpoint moves forward, so a resumed crawl truncates whatever was
+    written after it and never sees a partial page. A full crawl writes to
+    ``<output>.partial`` and replaces output when it finishes; an append
+    crawl writes to output directly.
+    """
+
+    def __init__(self, output: Path, append: bool, fsync_interval: float) -> None:
+        self.output = output
+        self.append = append
+        self.path = output if append else output.with_name(f"{output.name}.partial")
+        self.checkpoint_file = checkpoint_path(output)
+        self.fsync_interval = fsync_interval
+        self._file: BinaryIO | None = None
+        self._buffer: list[bytes] = []
+        self._checkpoint: Checkpoint | None = None
+        self._start: str | None = None
+        self._dirty = False
+        self._synced = time.monotonic()
+
+    def __enter__(self) -> "PageWriter":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def open(self, start: Checkpoint) -> Checkpoint:
+        """Open the output, returning the checkpoint the crawl continues from."""
+        checkpoint = load_checkpoint(self.checkpoint_file)
+        self._start = start.url
+        if checkpoint is not None and (
+            checkpoint.start != start.url
+            or checkpoint.append != self.append
+            or not self.path.exists()
+        ):
+            logger.warning(
+                f"ignore checkpoint of another crawl {self.checkpoint_file}, "
+                f"started at {checkpoint.start}"
+            )
+            checkpoint = None
+        if checkpoint is not None:
+            self._file = open(self.path, "r+b")
+            if checkpoint.offset is not None:
+                self._file.truncate(checkpoint.offset)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(self.path, "ab" if self.append else "wb")
+            self._file.seek(0, os.SEEK_END)
+            checkpoint = Checkpoint(
+                start.url,
+                start.page,
+                start.last_id,
+                self._file.tell(),
+                self.append,
+                start.url,
+            )
+            save_checkpoint(self.checkpoint_file, checkpoint)
+        self._checkpoint = checkpoint
+        self._synced = time.monotonic()
+        return checkpoint
+
+    def write(self, weibo: Weibo) -> None:
+        self._buffer.append(f"{weibo}\n".encode("utf-8"))
+
+    def commit(self, url: str, page: int, last_id: str | None) -> None:
+        """Write the buffered page, url and page are where the crawl goes next."""
+        assert self._file is not None
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+        self._checkpoint = Checkpoint(
+            url, page, last_id, self._file.tell(), self.append, self._start
+        )
+        self._dirty = True
+        if time.monotonic() - self._synced >= self.fsync_interval:
+            self._sync()
+
+    def finish(self) -> None:
+        """Commit the remaining records and publish the output."""
+        assert self._file is not None
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if not self.append:
+            self.path.replace(self.output)
+        # the crawl reached its end, nothing left to resume
+        self.checkpoint_file.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        # records of an unfinished page are dropped, committed pages are kept
+        if self._file is not None:
+            if self._dirty:
+                self._sync()
+            self._file.close()
+            self._file = None
+        self._buffer.clear()
+
+    def _sync(self) -> None:
+        assert self._file is not None and self._checkpoint is not None
+        os.fsync(self._file.fileno())
+        save_checkpoint(self.checkpoint_file, self._checkpoint)
+        self._dirty = False
+        self._synced = time.monotonic()
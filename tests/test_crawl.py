@@ -0,0 +1,77 @@
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import cast
+
+from wwg.client import CrawlClient
+from wwg.config import CrawlConfig
+from wwg.crawl import crawl_timeline
+
+pages = 5
+per_page = 3
+
+
+def post_html(i: int, repost: bool) -> str:
+    reason = '<span class="cmt">转发理由:</span>' if repost else ""
+    return (
+        f'<div class="c" id="M_{i}"><div>{reason}'
+        f'<span class="ctt">:post {i}</span>'
+        f'<span class="ct">2024-05-{i % 28 + 1:02d} 12:00:00 来自网页</span>'
+        '</div></div><div class="s"></div>'
+    )
+
+
+def page_html(n: int, reposts: bool) -> str:
+    first = 1000 - (n - 1) * per_page
+    posts = "".join(
+        # the last post of every page is a repost
+        post_html(first - k, reposts and k == per_page - 1)
+        for k in range(per_page)
+    )
+    next_page = (
+        f'<div id="pagelist"><form><div><a href="/1/profile?page={n + 1}">下页</a>'
+        f"&nbsp;{n}/{pages}页</div></form></div>"
+        if n < pages
+        else ""
+    )
+    return f"<html><body>{posts}{next_page}</body></html>"
+
+
+class StubClient:
+    """Serves the timeline pages, recording the page numbers fetched."""
+
+    def __init__(self, reposts: bool) -> None:
+        self.reposts = reposts
+        self.fetched: list[int] = []
+
+    def get(self, url: str) -> SimpleNamespace:
+        page = int(url.split("page=")[1]) if "page=" in url else 1
+        self.fetched.append(page)
+        return SimpleNamespace(text=page_html(page, self.reposts))
+
+
+def crawl(output: Path, reposts: bool) -> list[int]:
+    config = CrawlConfig(
+        uid="1",
+        output=output,
+        incremental=True,
+        original_only=True,
+        after=datetime(2020, 1, 1),
+    )
+    client = StubClient(reposts)
+    crawl_timeline(config, cast(CrawlClient, client))
+    return client.fetched
+
+
+def test_incremental_crawl_stops_at_known_page(tmp_path: Path) -> None:
+    output = tmp_path / "weibo.jsonl"
+    assert crawl(output, False) == [1, 2, 3, 4, 5]
+    assert crawl(output, False) == [1]
+
+
+def test_incremental_crawl_stops_at_known_page_with_reposts(tmp_path: Path) -> None:
+    output = tmp_path / "weibo.jsonl"
+    assert crawl(output, True) == [1, 2, 3, 4, 5]
+    # skipped reposts are not stored, they must not keep the crawl paging
+    assert crawl(output, True) == [1]
+    assert len(output.read_text(encoding="utf-8").splitlines()) == pages * 2
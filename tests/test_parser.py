@@ -0,0 +1,26 @@
+from datetime import datetime
+from pathlib import Path
+
+from wwg.parser import Html5libParser, LxmlParser
+
+fixtures = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+# relative create times of the fixtures are resolved against this
+fetched_at = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def read_fixture(name: str) -> str:
+    return (fixtures / name).read_text(encoding="utf-8")
+
+
+def test_parse_page_matches_html5lib() -> None:
+    html = read_fixture("profile.html")
+    page = LxmlParser().parse_page(html, fetched_at)
+    assert len(page.posts) > 0
+    assert page == Html5libParser().parse_page(html, fetched_at)
+
+
+def test_parse_full_text_matches_html5lib() -> None:
+    html = read_fixture("full_text.html")
+    weibo = LxmlParser().parse_full_text("Pg7h8i9", html, fetched_at)
+    assert weibo is not None
+    assert weibo == Html5libParser().parse_full_text("Pg7h8i9", html, fetched_at)